@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+r"""
+Archive-then-delete maintenance for the Logs table: streams rows older than a cutoff into
+compressed daily archive files, then deletes them in small batches so LogsWriterService
+keeps inserting while it runs. A gentler replacement for DeleteOldLogsJob's single
+unbounded ExecuteDeleteAsync on a busy bot.
+
+Usage (Windows PowerShell):
+  python Tools\archive_old_logs.py --out D:\morpheus-logs
+  python Tools\archive_old_logs.py --out D:\morpheus-logs --days 14 --batch-rows 2000 --pause-ms 500
+  python Tools\archive_old_logs.py --out D:\morpheus-logs --compression zstd --vacuum
+  python Tools\archive_old_logs.py --dry-run --days 30
+
+Archive:
+  Rows with InsertDate older than --days days are read in (InsertDate, Id) order through a
+  server-side cursor (--fetch-rows per round trip, REPEATABLE READ snapshot), so memory
+  stays flat however many there are. Each UTC day becomes one JSON lines file,
+  <out>\YYYY\MM\logs-YYYY-MM-DD.<run>.jsonl.gz (or .zst), with the Id, InsertDate,
+  Severity, Version and Message of every row. Files are written under a hidden .tmp name
+  and renamed only once the whole snapshot is archived, then manifest-<run>.json records
+  the cutoff, the Id range, row counts and sha256 of each file.
+
+Delete:
+  Only after the manifest is written, rows are deleted by Id keyset, --batch-rows at a
+  time, each batch its own short transaction restricted to the archived Id range and
+  the cutoff, with --pause-ms between batches. A batch that cannot get its locks within
+  --lock-timeout-ms is rolled back, counted as a lock wait and retried after a pause, so
+  the tool yields to the bot instead of queueing behind it. The report has rows/s, batch
+  latency percentiles, lock waits and how many other sessions were seen waiting on Logs.
+  A manifest whose delete did not finish (interrupted run) is completed first on the
+  next run, so rows are never archived twice. --vacuum runs VACUUM (ANALYZE) at the end.
+
+Environment:
+  Reads DB_CONNECTION_STRING from .env in repo root or process env, like import_dc_json.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+
+try:
+    import psycopg
+    from psycopg import errors
+except Exception:  # pragma: no cover
+    print("psycopg is required. Install with: pip install psycopg[binary]", file=sys.stderr)
+    raise
+
+from import_dc_json import load_connection_string, progress_printer
+from simulate_activity_load import percentiles
+
+
+COUNT_EXPIRED_SQL = 'SELECT count(*) FROM "Logs" WHERE "InsertDate" < %s'
+
+# IX_Logs_InsertDate_Severity gives the order; days arrive one after another
+STREAM_EXPIRED_SQL = """
+    SELECT "Id", "InsertDate", "Severity", "Version", "Message"
+    FROM "Logs"
+    WHERE "InsertDate" < %s
+    ORDER BY "InsertDate", "Id"
+"""
+
+DELETE_BATCH_SQL = """
+    WITH batch AS (
+        SELECT "Id" FROM "Logs"
+        WHERE "Id" > %s AND "Id" <= %s AND "InsertDate" < %s
+        ORDER BY "Id"
+        LIMIT %s
+    )
+    DELETE FROM "Logs" l USING batch WHERE l."Id" = batch."Id"
+    RETURNING l."Id"
+"""
+
+# other sessions waiting for a heavyweight lock on Logs (e.g. the bot's inserts)
+LOCK_WAITERS_SQL = """
+    SELECT count(*) FROM pg_locks l
+    JOIN pg_class c ON c.oid = l.relation
+    WHERE NOT l.granted AND c.relname = 'Logs' AND l.pid <> pg_backend_pid()
+"""
+
+DAILY_HISTOGRAM_SQL = """
+    SELECT ("InsertDate" AT TIME ZONE 'UTC')::date AS day, count(*)
+    FROM "Logs" WHERE "InsertDate" < %s
+    GROUP BY 1 ORDER BY 1
+"""
+
+MANIFEST_GLOB = "manifest-*.json"
+
+
+def _open_compressed(raw: BinaryIO, compression: str) -> BinaryIO:
+    """Compressing writer on top of raw; closing it leaves raw open for the fsync."""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+    try:
+        from compression import zstd  # py3.14+
+        return zstd.ZstdFile(raw, "wb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except Exception:
+        raise RuntimeError("zstandard is required for --compression zstd. Install with: pip install zstandard")
+    return zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DailyArchiveWriter:
+    """One compressed JSON lines file per UTC day, published only by finish()."""
+
+    def __init__(self, out_dir: Path, run: str, compression: str):
+        self.out_dir = out_dir
+        self.run = run
+        self.compression = compression
+        self.ext = "jsonl.gz" if compression == "gzip" else "jsonl.zst"
+        self.files: List[dict] = []  # finished, not yet published
+        self._day: Optional[dt.date] = None
+        self._raw: Optional[BinaryIO] = None  # the .tmp file under the compressor
+        self._fp: Optional[BinaryIO] = None
+        self._entry: dict = {}
+
+    def write(self, row: tuple) -> None:
+        log_id, insert_date, severity, version, message = row
+        day = insert_date.astimezone(dt.timezone.utc).date()
+        if day != self._day:
+            self._close()
+            self._open(day)
+        record = {"Id": log_id, "InsertDate": insert_date.isoformat(), "Severity": severity, "Version": version, "Message": message}
+        self._fp.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        e = self._entry
+        e["rows"] += 1
+        e["min_id"] = min(e["min_id"], log_id)
+        e["max_id"] = max(e["max_id"], log_id)
+
+    def _open(self, day: dt.date) -> None:
+        day_dir = self.out_dir / f"{day:%Y}" / f"{day:%m}"
+        day_dir.mkdir(parents=True, exist_ok=True)
+        name = f"logs-{day:%Y-%m-%d}.{self.run}.{self.ext}"
+        tmp = day_dir / f".{name}.tmp"
+        self._raw = tmp.open("wb")
+        self._fp = _open_compressed(self._raw, self.compression)
+        self._day = day
+        self._entry = {"day": day.isoformat(), "path": str((day_dir / name).relative_to(self.out_dir)), "tmp": tmp,
+                       "rows": 0, "min_id": sys.maxsize, "max_id": 0}
+
+    def _close(self) -> None:
+        if self._fp is None:
+            return
+        # end the compressed stream, then fsync the file it was written through
+        self._fp.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        self._fp = self._raw = None
+        self.files.append(self._entry)
+
+    def finish(self) -> List[dict]:
+        """Close (and fsync) the last file and rename every file to its final name."""
+        self._close()
+        published = []
+        for e in self.files:
+            tmp = e.pop("tmp")
+            final = self.out_dir / e["path"]
+            os.replace(tmp, final)
+            e["bytes"] = final.stat().st_size
+            e["sha256"] = _sha256(final)
+            published.append(e)
+        self.files = []
+        return published
+
+    def abandon(self) -> None:
+        """Drop the hidden files of an incomplete run."""
+        if self._fp is not None:
+            self._fp.close()
+            self._raw.close()
+            self._fp = self._raw = None
+            self.files.append(self._entry)
+        for e in self.files:
+            Path(e["tmp"]).unlink(missing_ok=True)
+        self.files = []
+
+
+def archive_expired(dsn: str, out_dir: Path, cutoff: dt.datetime, compression: str, fetch_rows: int) -> Optional[Path]:
+    """Stream rows older than cutoff into daily files and write the run's manifest."""
+    run = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    writer = DailyArchiveWriter(out_dir, run, compression)
+    t0 = time.time()
+    with psycopg.connect(dsn) as conn:
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        with conn.transaction():
+            total = conn.execute(COUNT_EXPIRED_SQL, (cutoff,)).fetchone()[0]
+            if total == 0:
+                print(f"No logs older than {cutoff:%Y-%m-%d %H:%M}")
+                return None
+            print(f"Archiving {total} logs older than {cutoff:%Y-%m-%d %H:%M} to {out_dir}")
+            draw_progress = progress_printer(total, "rows")
+            done = 0
+            try:
+                with conn.cursor(name="archive_old_logs") as cur:
+                    cur.itersize = fetch_rows
+                    cur.execute(STREAM_EXPIRED_SQL, (cutoff,))
+                    for row in cur:
+                        writer.write(row)
+                        done += 1
+                        draw_progress(done)
+            except BaseException:
+                writer.abandon()
+                raise
+            finally:
+                sys.stdout.write("\n")
+    files = writer.finish()
+    manifest = {
+        "run": run,
+        "cutoff": cutoff.isoformat(),
+        "compression": compression,
+        "rows": sum(e["rows"] for e in files),
+        "min_id": min(e["min_id"] for e in files),
+        "max_id": max(e["max_id"] for e in files),
+        "files": files,
+        "deleted": False,
+    }
+    path = out_dir / f"manifest-{run}.json"
+    _write_manifest(path, manifest)
+    took = time.time() - t0
+    size = sum(e["bytes"] for e in files)
+    print(f"Archived {manifest['rows']} rows in {len(files)} file(s), {size / 1e6:.1f} MB, in {took:.1f}s ({manifest['rows'] / max(took, 1e-6):.0f} rows/s)")
+    return path
+
+
+def _write_manifest(path: Path, manifest: dict) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def delete_archived(dsn: str, manifest_path: Path, batch_rows: int, pause: float, lock_timeout_ms: int) -> int:
+    """Delete the rows a manifest archived, keyset batch by batch; returns rows deleted."""
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    cutoff = dt.datetime.fromisoformat(manifest["cutoff"])
+    last_id = manifest.get("deleted_through_id", manifest["min_id"] - 1)
+    max_id = manifest["max_id"]
+    expected = manifest["rows"] - manifest.get("deleted_rows", 0)
+    deleted = 0
+    lock_waits = 0
+    max_waiters = 0
+    batch_times: List[float] = []
+    print(f"Deleting {expected} archived logs (Id {last_id + 1}..{max_id}) in batches of {batch_rows}")
+    draw_progress = progress_printer(expected, "rows")
+    t0 = time.time()
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        try:
+            while True:
+                t_batch = time.perf_counter()
+                try:
+                    with conn.transaction():
+                        conn.execute(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+                        ids = [r[0] for r in conn.execute(DELETE_BATCH_SQL, (last_id, max_id, cutoff, batch_rows))]
+                except errors.LockNotAvailable:
+                    lock_waits += 1
+                    time.sleep(max(pause, 0.5) * min(lock_waits, 10))
+                    continue
+                batch_times.append(time.perf_counter() - t_batch)
+                if not ids:
+                    break
+                deleted += len(ids)
+                last_id = max(ids)
+                # progress survives an interrupted run
+                manifest["deleted_through_id"] = last_id
+                manifest["deleted_rows"] = manifest.get("deleted_rows", 0) + len(ids)
+                _write_manifest(manifest_path, manifest)
+                max_waiters = max(max_waiters, conn.execute(LOCK_WAITERS_SQL).fetchone()[0])
+                draw_progress(min(deleted, expected))
+                if pause > 0:
+                    time.sleep(pause)
+        finally:
+            sys.stdout.write("\n")
+    manifest["deleted"] = True
+    _write_manifest(manifest_path, manifest)
+    took = time.time() - t0
+    p = percentiles(batch_times)
+    print(
+        f"Deleted {deleted} rows in {len(batch_times)} batch(es) in {took:.1f}s ({deleted / max(took, 1e-6):.0f} rows/s); "
+        f"batch ms p50={p.get('p50', 0):.1f} p99={p.get('p99', 0):.1f} max={p.get('max', 0):.1f}; "
+        f"lock waits={lock_waits}, most sessions seen waiting on Logs={max_waiters}"
+    )
+    if deleted != expected:
+        print(f"Note: {expected} rows were archived but {deleted} deleted (rows removed by someone else meanwhile?)")
+    return deleted
+
+
+def pending_manifests(out_dir: Path) -> List[Path]:
+    pending = []
+    for path in sorted(out_dir.glob(MANIFEST_GLOB)):
+        try:
+            if not json.loads(path.read_text(encoding="utf-8")).get("deleted"):
+                pending.append(path)
+        except (OSError, ValueError):
+            print(f"Skipping unreadable manifest {path}", file=sys.stderr)
+    return pending
+
+
+def dry_run(dsn: str, cutoff: dt.datetime) -> int:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        days: Dict[dt.date, int] = dict(conn.execute(DAILY_HISTOGRAM_SQL, (cutoff,)).fetchall())
+    total = sum(days.values())
+    print(f"{total} logs older than {cutoff:%Y-%m-%d %H:%M} over {len(days)} day(s)")
+    for day, n in days.items():
+        print(f"  {day:%Y-%m-%d} {n:>10}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Archive old Logs rows to compressed daily files, then delete them in small batches")
+    ap.add_argument("--out", type=str, default=None, help="Archive directory (required unless --dry-run)")
+    ap.add_argument("--days", type=int, default=30, help="Archive logs older than this many days (default: 30, like DeleteOldLogsJob)")
+    ap.add_argument("--compression", choices=("gzip", "zstd"), default="gzip", help="Archive compression (default: gzip)")
+    ap.add_argument("--fetch-rows", type=int, default=10_000, help="Rows per server-side cursor fetch (default: 10000)")
+    ap.add_argument("--batch-rows", type=int, default=5_000, help="Rows per delete transaction (default: 5000)")
+    ap.add_argument("--pause-ms", type=int, default=200, help="Pause between delete batches (default: 200)")
+    ap.add_argument("--lock-timeout-ms", type=int, default=2_000, help="Give up a delete batch after waiting this long for locks, then retry (default: 2000)")
+    ap.add_argument("--archive-only", action="store_true", help="Write the archive and manifest but do not delete")
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) Logs after deleting")
+    ap.add_argument("--dry-run", action="store_true", help="Only show how many rows per day would be archived")
+    ap.add_argument("--dsn", type=str, default=None, help="Connection string (default: DB_CONNECTION_STRING)")
+    args = ap.parse_args(argv)
+
+    if args.days < 1 or args.batch_rows < 1 or args.fetch_rows < 1:
+        ap.error("--days, --batch-rows and --fetch-rows must be >= 1")
+    if not args.dry_run and not args.out:
+        ap.error("--out is required")
+    dsn = args.dsn or load_connection_string()
+    if not dsn:
+        print("DB_CONNECTION_STRING not set; provide .env, environment or --dsn", file=sys.stderr)
+        return 2
+    cutoff = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=args.days)
+    if args.dry_run:
+        return dry_run(dsn, cutoff)
+
+    out_dir = Path(args.out).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pause = args.pause_ms / 1000.0
+    try:
+        for path in pending_manifests(out_dir):
+            if args.archive_only:
+                print(f"{path.name} is archived but not deleted yet; run without --archive-only first", file=sys.stderr)
+                return 1
+            print(f"Finishing the delete of {path.name} from an earlier run")
+            delete_archived(dsn, path, args.batch_rows, pause, args.lock_timeout_ms)
+        manifest = archive_expired(dsn, out_dir, cutoff, args.compression, args.fetch_rows)
+        if manifest is not None and not args.archive_only:
+            delete_archived(dsn, manifest, args.batch_rows, pause, args.lock_timeout_ms)
+        if args.vacuum and not args.archive_only:
+            t0 = time.time()
+            with psycopg.connect(dsn, autocommit=True) as conn:
+                conn.execute('VACUUM (ANALYZE) "Logs"')
+            print(f"Vacuumed Logs in {time.time() - t0:.1f}s")
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to finish (archived rows are deleted first)")
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,674 @@
+#!/usr/bin/env python3
+r"""
+Synthetic activity history for database-scale benchmarks: fills a scratch Postgres with
+Guilds, Users, UserLevels and UserActivity at a target size (parallel binary COPY) and
+times the project's hot queries against it.
+
+Usage (Windows PowerShell):
+  python Tools\generate_activity_history.py --rows 10000000 --guilds 500 --users 200000 --days 365
+  python Tools\generate_activity_history.py --rows 100000000 --workers 8 --defer-indexes --bench
+  python Tools\generate_activity_history.py --bench --repeat 10 --report-json after-index.json
+  python Tools\generate_activity_history.py --bench --explain
+  python Tools\generate_activity_history.py --reset
+
+Shape of the data:
+  --guilds guilds get Zipf(--guild-skew) shares of --rows, so a few whale guilds hold most
+  of the history. The biggest guild has --member-share of the --users users as members,
+  smaller guilds proportionally fewer (at least 10). Users are ranked globally and authors
+  inside a guild are Zipf(--user-skew) over that ranking, so power users are the same
+  accounts everywhere. Messages span the last --days days, with day-to-day noise, quieter
+  weekends and a diurnal curve of amplitude --diurnal (0 = flat, 0.9 = nights almost
+  empty) peaking at a per-guild hour. --dup-rate messages repeat the author's previous
+  one. Lengths are log-normal; XP, guild average and count are computed with the shared
+  scoring core (xp_scoring.py) against the author's previous message, so penalties and
+  the length bonus look like imported data. Ids come from reserved synthetic ranges (see
+  SYNTH_* below) and --reset deletes exactly those rows.
+
+Loading:
+  The history is cut into work units of about --chunk-rows rows (one guild, consecutive
+  days) and --workers processes each COPY their units in binary format on their own
+  connection. --defer-indexes drops the secondary UserActivity indexes for the load and
+  rebuilds them afterwards (in parallel), which is much faster than maintaining them
+  row by row. UserLevels is then derived from UserActivity in one INSERT ... SELECT
+  (UserAverageMessageLengthEma is set to the plain average), --rollup backfills
+  UserActivityDaily for the generated guilds, and the tables are ANALYZEd.
+
+Benchmark (--bench):
+  Times the leaderboard queries of ActivityLeaderboardService, the DashboardStatsService
+  totals, the bot's per-message reads and the importer's seed queries (PREV_GUILD_SQL,
+  SEED_PREV_USER_SQL, SEED_RECENT_SQL, SEED_GUILD_SIMHASH_SQL) for the biggest and the
+  median guild, relative to the newest row in UserActivity. Every query runs once to warm
+  up and then --repeat times; the report has median, min and max ms and rows returned.
+  --explain prints EXPLAIN (ANALYZE, BUFFERS) of each statement instead of timing it.
+  The benchmark works on any database, not only on generated data.
+
+WARNING: generation writes millions of rows. Point DB_CONNECTION_STRING (or --dsn) at a
+scratch database, never at the live bot's.
+
+Environment:
+  Reads DB_CONNECTION_STRING from .env in repo root or process env, like import_dc_json.py.
+  ACTIVITY_SIMILARITY_WINDOW_MINUTES (default 10) sizes the similarity window.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import datetime as dt
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import psycopg
+    from psycopg import sql
+except Exception:  # pragma: no cover
+    print("psycopg is required. Install with: pip install psycopg[binary]", file=sys.stderr)
+    raise
+
+from import_dc_json import (
+    INSERT_GUILD_SQL,
+    PREV_GUILD_SQL,
+    ROLLUP_BACKFILL_SQL,
+    SEED_GUILD_SIMHASH_SQL,
+    SEED_PREV_USER_SQL,
+    SEED_RECENT_SQL,
+    USERACTIVITY_COLUMNS,
+    ensure_rollup_table,
+    load_connection_string,
+    progress_printer,
+)
+from simulate_activity_load import PREV_GUILD_ACTIVITY_SQL, PREV_USER_ACTIVITY_SQL, RECENT_SIMILARITY_SQL
+from xp_scoring import MessageFingerprint, compute_xp_breakdown, next_guild_average
+
+
+# ===================== Synthetic id ranges =====================
+
+# Discord ids the generator owns (the load simulator uses 800..820e15)
+SYNTH_GUILD_BASE = 830_000_000_000_000_000
+SYNTH_USER_BASE = 840_000_000_000_000_000
+SYNTH_CHANNEL_BASE = 850_000_000_000_000_000
+SYNTH_RANGE = 1_000_000_000_000_000
+DISCORD_EPOCH_MS = 1_420_070_400_000
+
+USERS_COPY_SQL = """
+    COPY "Users" ("DiscordId", "Username", "InsertDate", "LastUsernameCheck", "LevelUpMessages", "LevelUpQuotes")
+    FROM STDIN (FORMAT BINARY)
+"""
+USERS_COPY_TYPES = ("numeric", "text", "timestamptz", "timestamptz", "bool", "bool")
+
+ACTIVITY_COPY_SQL = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT BINARY)").format(
+    sql.Identifier("UserActivity"), sql.SQL(", ").join(map(sql.Identifier, USERACTIVITY_COLUMNS))
+)
+# same order as USERACTIVITY_COLUMNS
+ACTIVITY_COPY_TYPES = (
+    "numeric", "numeric", "int4", "int4", "timestamptz",
+    "text", "int4", "numeric", "int4",
+    "int4", "float8", "int4",
+)
+
+# UserLevels as the bot would have accumulated it; Level is calculate_level() in SQL
+DERIVE_USERLEVELS_SQL = """
+    INSERT INTO "UserLevels" (
+        "UserId", "GuildId", "Level", "TotalXp",
+        "UserMessageCount", "UserAverageMessageLength", "UserAverageMessageLengthEma"
+    )
+    SELECT "UserId", "GuildId",
+        floor(power(log((sum("XpGained") + 111.0) / 111.0), 5.0243))::int,
+        sum("XpGained")::int, count(*)::int, avg("MessageLength"), avg("MessageLength")
+    FROM "UserActivity"
+    WHERE "GuildId" = ANY(%s)
+    GROUP BY "UserId", "GuildId"
+"""
+
+SECONDARY_INDEXES_SQL = """
+    SELECT i.indexname, i.indexdef
+    FROM pg_indexes i
+    JOIN pg_class c ON c.relname = i.indexname
+    JOIN pg_index x ON x.indexrelid = c.oid
+    WHERE i.schemaname = current_schema() AND i.tablename = 'UserActivity'
+      AND NOT x.indisprimary AND NOT x.indisunique
+    ORDER BY i.indexname
+"""
+
+
+# ===================== Plan =====================
+
+class GuildPlan(NamedTuple):
+    index: int
+    discord_id: int
+    peak_hour: float  # UTC hour of the diurnal maximum
+    channels: int
+    members: int
+    day_counts: List[int]
+
+
+class WorkUnit(NamedTuple):
+    unit_no: int
+    guild_index: int
+    guild_id: int  # Guilds.Id
+    first_day: int
+    day_counts: List[int]
+    count_before: int  # GuildMessageCount before the unit's first message
+
+
+def zipf_weights(n: int, skew: float) -> List[float]:
+    return [1.0 / rank ** skew for rank in range(1, n + 1)]
+
+
+def zipf_rank(u: float, n: int, skew: float) -> int:
+    """0-based rank from a continuous Zipf(skew) over 1..n by inverse CDF (O(1), no tables)."""
+    if n <= 1:
+        return 0
+    if abs(skew - 1.0) < 1e-9:
+        x = math.exp(u * math.log(n + 1))
+    else:
+        e = 1.0 - skew
+        x = ((math.pow(n + 1, e) - 1.0) * u + 1.0) ** (1.0 / e)
+    return min(n - 1, int(x) - 1)
+
+
+def split_total(total: int, weights: Sequence[float]) -> List[int]:
+    """Integer shares of total proportional to weights, summing exactly to total."""
+    w_sum = sum(weights)
+    raw = [total * w / w_sum for w in weights]
+    out = [int(r) for r in raw]
+    short = total - sum(out)
+    for i in sorted(range(len(raw)), key=lambda i: out[i] - raw[i])[:short]:
+        out[i] += 1
+    return out
+
+
+def plan_history(args: argparse.Namespace, rng: random.Random) -> List[GuildPlan]:
+    shares = split_total(args.rows, zipf_weights(args.guilds, args.guild_skew))
+    biggest = max(1, round(args.users * args.member_share))
+    plans = []
+    for i, n in enumerate(shares):
+        members = min(args.users, max(10, round(biggest / (i + 1) ** args.guild_skew)))
+        # day noise, weekends at 80%, slow growth towards the present
+        day_w = []
+        for d in range(args.days):
+            weekday = (args.start + dt.timedelta(days=d)).weekday()
+            day_w.append(rng.lognormvariate(0.0, 0.35) * (0.8 if weekday >= 5 else 1.0) * (0.6 + 0.4 * d / max(1, args.days)))
+        plans.append(GuildPlan(
+            i, SYNTH_GUILD_BASE + i, rng.gauss(19.0, 4.0) % 24.0,
+            max(2, min(60, 2 + members // 200)), members, split_total(n, day_w),
+        ))
+    return plans
+
+
+def plan_units(plans: List[GuildPlan], guild_ids: Dict[int, int], chunk_rows: int) -> List[WorkUnit]:
+    units: List[WorkUnit] = []
+    for p in plans:
+        count = 0
+        day = 0
+        while day < len(p.day_counts):
+            first = day
+            rows = 0
+            while day < len(p.day_counts) and (rows == 0 or rows + p.day_counts[day] <= chunk_rows):
+                rows += p.day_counts[day]
+                day += 1
+            if rows:
+                units.append(WorkUnit(len(units), p.index, guild_ids[p.discord_id], first, p.day_counts[first:day], count))
+            count += rows
+    # biggest first so the pool finishes evenly
+    units.sort(key=lambda u: -sum(u.day_counts))
+    return units
+
+
+def guild_members(plan: GuildPlan, users: int, seed: int) -> array:
+    """Global user ranks of a guild's members, most active first (deterministic per guild)."""
+    rng = random.Random(seed * 1_000_003 + plan.index)
+    if plan.members >= users:
+        return array("i", range(users))
+    return array("i", sorted(rng.sample(range(users), plan.members)))
+
+
+# ===================== Workers =====================
+
+_worker: dict = {}
+
+
+def _init_worker(dsn: str, plans: List[GuildPlan], user_ids: array, members: Dict[int, array], cfg: dict):
+    _worker.update(dsn=dsn, plans=plans, user_ids=user_ids, members=members, cfg=cfg)
+
+
+def _mean_length(mu: float, sigma: float) -> float:
+    return math.exp(mu + sigma * sigma / 2.0)
+
+
+def _day_timestamps(rng: random.Random, n: int, day_start: float, peak_hour: float, amplitude: float) -> List[float]:
+    """n sorted epoch seconds within one day, rejection-sampled from 1 + A*cos(hour - peak)."""
+    out = []
+    top = 1.0 + amplitude
+    while len(out) < n:
+        s = rng.random() * 86400.0
+        hour = ((day_start + s) / 3600.0) % 24.0
+        if rng.random() * top <= 1.0 + amplitude * math.cos((hour - peak_hour) * math.pi / 12.0):
+            out.append(day_start + s)
+    out.sort()
+    return out
+
+
+def _generate_unit(unit: WorkUnit) -> Tuple[int, float]:
+    cfg = _worker["cfg"]
+    plan: GuildPlan = _worker["plans"][unit.guild_index]
+    members: array = _worker["members"][unit.guild_index]
+    user_ids: array = _worker["user_ids"]
+    rng = random.Random(cfg["seed"] * 7_919 + unit.unit_no)
+    window = dt.timedelta(minutes=cfg["window_minutes"])
+    mu, sigma = cfg["length_mu"], cfg["length_sigma"]
+    n_members = len(members)
+    # a unit that does not start the guild resumes from a converged EMA
+    guild_avg = _mean_length(mu, sigma) if unit.count_before else 0.0
+    guild_count = unit.count_before
+    channel_base = SYNTH_CHANNEL_BASE + plan.index * 1000
+    unit_bits = (unit.unit_no & 0x3FF) << 12
+    # per author: (InsertDate, MessageHash, MessageSimHash, NormalizedLength, MessageLength)
+    last: Dict[int, tuple] = {}
+    seq = 0
+    t0 = time.time()
+    with psycopg.connect(_worker["dsn"]) as conn:
+        with conn.cursor() as cur:
+            with cur.copy(ACTIVITY_COPY_SQL) as copy:
+                copy.set_types(list(ACTIVITY_COPY_TYPES))
+                for i, n in enumerate(unit.day_counts):
+                    day_start = cfg["start_epoch"] + (unit.first_day + i) * 86400.0
+                    for epoch in _day_timestamps(rng, n, day_start, plan.peak_hour, cfg["diurnal"]):
+                        ts = dt.datetime.fromtimestamp(epoch, dt.timezone.utc)
+                        uid = user_ids[members[zipf_rank(rng.random(), n_members, cfg["user_skew"])]]
+                        prev = last.get(uid)
+                        if prev is not None and rng.random() < cfg["dup_rate"]:
+                            _, msg_hash, simhash, norm_len, length = prev
+                        else:
+                            length = min(2000, max(1, int(rng.lognormvariate(mu, sigma))))
+                            norm_len = max(0, length - int(length * 0.1 * rng.random()))
+                            msg_hash = base64.b64encode(rng.getrandbits(64).to_bytes(8, "big")).decode("ascii")
+                            simhash = rng.getrandbits(64)
+                        fp = MessageFingerprint(length, msg_hash, simhash, norm_len)
+                        if prev is not None:
+                            prev_user = (0, prev[0], prev[1])
+                            recent = [(prev[2], prev[3], prev[0])] if ts - prev[0] <= window else []
+                        else:
+                            prev_user, recent = None, []
+                        xp = compute_xp_breakdown(
+                            fp, ts, prev_user, recent, (guild_avg, guild_count) if guild_count else None
+                        ).xp
+                        guild_avg, guild_count = next_guild_average(guild_avg, guild_count, length)
+                        last[uid] = (ts, msg_hash, simhash, norm_len, length)
+                        ms = int(epoch * 1000)
+                        message_id = ((ms - DISCORD_EPOCH_MS) << 22) | unit_bits | (seq & 0xFFF)
+                        seq += 1
+                        channel = channel_base + zipf_rank(rng.random(), plan.channels, 1.0)
+                        copy.write_row((
+                            channel, message_id, unit.guild_id, uid, ts,
+                            msg_hash, length, simhash, norm_len,
+                            xp, guild_avg, guild_count,
+                        ))
+        conn.commit()
+    return seq, time.time() - t0
+
+
+# ===================== Generation =====================
+
+def synthetic_guild_ids(conn: psycopg.Connection) -> List[int]:
+    return [r[0] for r in conn.execute(
+        'SELECT "Id" FROM "Guilds" WHERE "DiscordId" >= %s AND "DiscordId" < %s ORDER BY "Id"',
+        (SYNTH_GUILD_BASE, SYNTH_GUILD_BASE + SYNTH_RANGE),
+    )]
+
+
+def reset_synthetic(conn: psycopg.Connection) -> None:
+    """Delete everything the generator created (synthetic Discord id ranges only)."""
+    t0 = time.time()
+    ids = synthetic_guild_ids(conn)
+    with conn.transaction():
+        if conn.execute("SELECT to_regclass('\"UserActivityDaily\"')").fetchone()[0] is not None:
+            conn.execute('DELETE FROM "UserActivityDaily" WHERE "GuildId" = ANY(%s)', (ids,))
+        conn.execute('DELETE FROM "UserLevels" WHERE "GuildId" = ANY(%s)', (ids,))
+        activity = conn.execute('DELETE FROM "UserActivity" WHERE "GuildId" = ANY(%s)', (ids,)).rowcount
+        conn.execute('DELETE FROM "Guilds" WHERE "Id" = ANY(%s)', (ids,))
+        users = conn.execute(
+            'DELETE FROM "Users" WHERE "DiscordId" >= %s AND "DiscordId" < %s', (SYNTH_USER_BASE, SYNTH_USER_BASE + SYNTH_RANGE)
+        ).rowcount
+    print(f"Reset: removed {len(ids)} guilds, {users} users and {activity} activity rows in {time.time() - t0:.1f}s")
+
+
+def create_members(conn: psycopg.Connection, plans: List[GuildPlan], args: argparse.Namespace, rng: random.Random) -> Tuple[Dict[int, int], array]:
+    """Insert the guilds and users; returns Guilds.Id by DiscordId and Users.Id by global rank."""
+    t0 = time.time()
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.executemany(INSERT_GUILD_SQL, [
+                (p.discord_id, f"synthetic-{p.index:05d}", "!", args.start - dt.timedelta(days=rng.randrange(1, 30)))
+                for p in plans
+            ])
+            with cur.copy(USERS_COPY_SQL) as copy:
+                copy.set_types(list(USERS_COPY_TYPES))
+                for rank in range(args.users):
+                    joined = args.start - dt.timedelta(days=rng.randrange(0, 365), seconds=rng.randrange(86400))
+                    copy.write_row((SYNTH_USER_BASE + rank, f"synth{rank}", joined, args.end, False, False))
+    guild_ids = dict((int(d), i) for i, d in conn.execute(
+        'SELECT "Id", "DiscordId" FROM "Guilds" WHERE "DiscordId" >= %s AND "DiscordId" < %s',
+        (SYNTH_GUILD_BASE, SYNTH_GUILD_BASE + SYNTH_RANGE),
+    ))
+    user_ids = array("i", [0] * args.users)
+    for i, d in conn.execute(
+        'SELECT "Id", "DiscordId" FROM "Users" WHERE "DiscordId" >= %s AND "DiscordId" < %s',
+        (SYNTH_USER_BASE, SYNTH_USER_BASE + SYNTH_RANGE),
+    ):
+        user_ids[int(d) - SYNTH_USER_BASE] = i
+    print(f"Created {len(guild_ids)} guilds and {args.users} users in {time.time() - t0:.1f}s")
+    return guild_ids, user_ids
+
+
+def drop_secondary_indexes(conn: psycopg.Connection) -> List[Tuple[str, str]]:
+    indexes = [(name, ddl) for name, ddl in conn.execute(SECONDARY_INDEXES_SQL)]
+    for name, _ in indexes:
+        conn.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+    if indexes:
+        print(f"Dropped {len(indexes)} UserActivity index(es) for the load")
+    return indexes
+
+
+def rebuild_indexes(dsn: str, indexes: List[Tuple[str, str]], workers: int) -> None:
+    def build(item: Tuple[str, str]) -> Tuple[str, float]:
+        t = time.time()
+        with psycopg.connect(dsn, autocommit=True) as c:
+            c.execute(item[1])
+        return item[0], time.time() - t
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for name, took in pool.map(build, indexes):
+            print(f"  rebuilt {name} in {took:.1f}s")
+    print(f"Rebuilt {len(indexes)} index(es) in {time.time() - t0:.1f}s")
+
+
+def generate(dsn: str, args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    plans = plan_history(args, rng)
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if synthetic_guild_ids(conn):
+            print("The database already holds synthetic guilds; run with --reset first (or together with --rows)", file=sys.stderr)
+            return 2
+        guild_ids, user_ids = create_members(conn, plans, args, rng)
+        indexes = drop_secondary_indexes(conn) if args.defer_indexes else []
+
+    units = plan_units(plans, guild_ids, args.chunk_rows)
+    members = {p.index: guild_members(p, args.users, args.seed) for p in plans}
+    cfg = {
+        "seed": args.seed, "start_epoch": args.start.timestamp(), "diurnal": args.diurnal,
+        "user_skew": args.user_skew, "dup_rate": args.dup_rate, "window_minutes": args.window_minutes,
+        "length_mu": 3.2, "length_sigma": 0.9,
+    }
+    top = plans[0]
+    print(
+        f"Generating {args.rows} rows in {len(units)} unit(s) on {args.workers} worker(s): "
+        f"biggest guild {sum(top.day_counts)} rows / {top.members} members, "
+        f"{args.days} days from {args.start:%Y-%m-%d}"
+    )
+    t0 = time.time()
+    done = 0
+    draw_progress = progress_printer(args.rows, "rows")
+    try:
+        if args.workers > 1:
+            with multiprocessing.Pool(args.workers, _init_worker, (dsn, plans, user_ids, members, cfg)) as pool:
+                for rows, _ in pool.imap_unordered(_generate_unit, units):
+                    done += rows
+                    draw_progress(done)
+        else:
+            _init_worker(dsn, plans, user_ids, members, cfg)
+            for unit in units:
+                rows, _ = _generate_unit(unit)
+                done += rows
+                draw_progress(done)
+    finally:
+        sys.stdout.write("\n")
+        if indexes:
+            rebuild_indexes(dsn, indexes, args.workers)
+    took = time.time() - t0
+    print(f"Loaded {done} activity rows in {took:.1f}s ({done / took if took > 0 else 0:.0f} rows/s)")
+
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        t1 = time.time()
+        levels = conn.execute(DERIVE_USERLEVELS_SQL, (list(guild_ids.values()),)).rowcount
+        print(f"Derived {levels} UserLevels rows in {time.time() - t1:.1f}s")
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if args.rollup:
+            t1 = time.time()
+            ensure_rollup_table(conn)
+            first_day = dt.datetime.combine(args.start.date(), dt.time(), dt.timezone.utc)
+            days = sum(
+                conn.execute(ROLLUP_BACKFILL_SQL, (gid, first_day, args.end + dt.timedelta(days=1))).rowcount
+                for gid in guild_ids.values()
+            )
+            print(f"Backfilled {days} UserActivityDaily user-days in {time.time() - t1:.1f}s")
+        t1 = time.time()
+        for table in ("Guilds", "Users", "UserLevels", "UserActivity"):
+            conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+        print(f"Analyzed in {time.time() - t1:.1f}s")
+    return 0
+
+
+# ===================== Benchmark =====================
+
+class BenchQuery(NamedTuple):
+    name: str
+    statements: List[Tuple[str, tuple]]
+
+
+def _leaderboard(name: str, ranked_sql: str, params: tuple) -> BenchQuery:
+    """ActivityLeaderboardService pattern: CountAsync over the ranking, then page 1 (10 rows)."""
+    return BenchQuery(name, [
+        (f"SELECT count(*) FROM ({ranked_sql}) s", params),
+        (f"{ranked_sql} LIMIT 10 OFFSET 0", params),
+    ])
+
+
+def bench_queries(conn: psycopg.Connection, window_minutes: int) -> Tuple[List[BenchQuery], dict]:
+    now = conn.execute('SELECT max("InsertDate") FROM "UserActivity"').fetchone()[0]
+    if now is None:
+        raise RuntimeError("UserActivity is empty")
+    now = now + dt.timedelta(seconds=1)
+    ranked = conn.execute(
+        'SELECT "GuildId", sum("UserMessageCount") AS n FROM "UserLevels" GROUP BY "GuildId" ORDER BY n DESC'
+    ).fetchall()
+    if not ranked:
+        raise RuntimeError("UserLevels is empty")
+    guilds = [("whale", ranked[0][0])]
+    if len(ranked) > 2:
+        guilds.append(("median", ranked[len(ranked) // 2][0]))
+    week, month = now - dt.timedelta(days=7), now - dt.timedelta(days=30)
+    day_start = dt.datetime.combine(now.astimezone(dt.timezone.utc).date(), dt.time(), dt.timezone.utc)
+    window_start = now - dt.timedelta(minutes=window_minutes)
+
+    queries = [
+        _leaderboard("global xp leaderboard", 'SELECT "UserId", sum("TotalXp")::bigint AS v FROM "UserLevels" GROUP BY "UserId" ORDER BY v DESC', ()),
+        _leaderboard(
+            "global xp leaderboard 7d",
+            'SELECT "UserId", sum("XpGained")::bigint AS v FROM "UserActivity" WHERE "InsertDate" >= %s GROUP BY "UserId" ORDER BY v DESC',
+            (week,),
+        ),
+        BenchQuery("dashboard totals", [
+            ('SELECT count(*) FROM "Guilds"', ()),
+            ('SELECT count(*) FROM "Users"', ()),
+            ('SELECT sum("UserMessageCount")::bigint, sum("TotalXp")::bigint FROM "UserLevels"', ()),
+        ]),
+        BenchQuery("dashboard last 30d", [
+            ('SELECT count(*) FROM (SELECT DISTINCT "UserId" FROM "UserActivity" WHERE "InsertDate" >= %s) s', (month,)),
+            ('SELECT count(*) FROM "UserActivity" WHERE "InsertDate" >= %s', (month,)),
+            ('SELECT sum("XpGained")::bigint FROM "UserActivity" WHERE "InsertDate" >= %s', (month,)),
+            ('SELECT max("InsertDate") FROM "UserActivity"', ()),
+            ('SELECT count(*), sum("XpGained")::bigint FROM "UserActivity" WHERE "InsertDate" >= %s AND "InsertDate" < %s',
+             (day_start, day_start + dt.timedelta(days=1))),
+        ]),
+        BenchQuery("dashboard guild summaries", [(
+            'SELECT g."Id", g."Name",'
+            ' (SELECT count(*) FROM "UserLevels" l WHERE l."GuildId" = g."Id"),'
+            ' (SELECT count(*) FROM "UserActivity" a WHERE a."GuildId" = g."Id"),'
+            ' (SELECT sum(a."XpGained")::bigint FROM "UserActivity" a WHERE a."GuildId" = g."Id")'
+            ' FROM "Guilds" g ORDER BY g."Name"',
+            (),
+        )]),
+    ]
+    for label, gid in guilds:
+        top_users = [r[0] for r in conn.execute(
+            'SELECT "UserId" FROM "UserLevels" WHERE "GuildId" = %s ORDER BY "UserMessageCount" DESC LIMIT 500', (gid,)
+        )]
+        power_user = top_users[0]
+        queries += [
+            _leaderboard(f"{label}: xp leaderboard", 'SELECT "UserId", "TotalXp" FROM "UserLevels" WHERE "GuildId" = %s ORDER BY "TotalXp" DESC', (gid,)),
+            _leaderboard(
+                f"{label}: xp leaderboard 7d",
+                'SELECT "UserId", sum("XpGained")::bigint AS v FROM "UserActivity" WHERE "GuildId" = %s AND "InsertDate" >= %s GROUP BY "UserId" ORDER BY v DESC',
+                (gid, week),
+            ),
+            _leaderboard(
+                f"{label}: messages leaderboard 30d",
+                'SELECT "UserId", count(*) AS v FROM "UserActivity" WHERE "GuildId" = %s AND "InsertDate" >= %s GROUP BY "UserId" ORDER BY v DESC',
+                (gid, month),
+            ),
+            _leaderboard(
+                f"{label}: avg length leaderboard",
+                'SELECT "UserId", "UserAverageMessageLength" FROM "UserLevels" WHERE "GuildId" = %s AND "UserMessageCount" > 0 ORDER BY "UserAverageMessageLength" DESC',
+                (gid,),
+            ),
+            BenchQuery(f"{label}: activity graph 30d", [(
+                'SELECT "UserId", ("InsertDate" AT TIME ZONE \'UTC\')::date AS d, sum("XpGained")::bigint, count(*)'
+                ' FROM "UserActivity" WHERE "GuildId" = %s AND "InsertDate" >= %s GROUP BY 1, 2',
+                (gid, month),
+            )]),
+            BenchQuery(f"{label}: bot per-message reads", [
+                (PREV_USER_ACTIVITY_SQL, (power_user, gid)),
+                (RECENT_SIMILARITY_SQL, (power_user, gid, window_start)),
+                (PREV_GUILD_ACTIVITY_SQL, (gid,)),
+            ]),
+            BenchQuery(f"{label}: import seed", [
+                (PREV_GUILD_SQL, (gid, now)),
+                (SEED_PREV_USER_SQL, (top_users, gid, now)),
+                (SEED_RECENT_SQL, (top_users, gid, window_start, now)),
+            ]),
+            BenchQuery(f"{label}: import guild simhash window", [(SEED_GUILD_SIMHASH_SQL, (gid, window_start, now))]),
+        ]
+        if conn.execute("SELECT to_regclass('\"UserActivityDaily\"')").fetchone()[0] is not None:
+            queries.append(_leaderboard(
+                f"{label}: xp leaderboard 7d (rollup)",
+                'SELECT "UserId", sum("XpSum")::bigint AS v FROM "UserActivityDaily" WHERE "GuildId" = %s AND "Day" >= %s GROUP BY "UserId" ORDER BY v DESC',
+                (gid, week.astimezone(dt.timezone.utc).date()),
+            ))
+    context = {"now": now.isoformat(), "guilds": dict(guilds)}
+    return queries, context
+
+
+def run_bench(dsn: str, args: argparse.Namespace) -> int:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        rows = conn.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'UserActivity'").fetchone()
+        try:
+            queries, context = bench_queries(conn, args.window_minutes)
+        except RuntimeError as e:
+            print(f"Cannot benchmark: {e}", file=sys.stderr)
+            return 2
+        print(f"Benchmarking against ~{rows[0] if rows else '?'} UserActivity rows, now={context['now']}, guilds={context['guilds']}")
+
+        if args.explain:
+            for q in queries:
+                for stmt, params in q.statements:
+                    print(f"\n== {q.name}\n{' '.join(stmt.split())}")
+                    for (line,) in conn.execute("EXPLAIN (ANALYZE, BUFFERS) " + stmt, params):
+                        print(f"  {line}")
+            return 0
+
+        report = {"context": context, "repeat": args.repeat, "queries": {}}
+        print(f"{'query (ms)':<44}{'median':>10}{'min':>10}{'max':>10}{'rows':>9}")
+        for q in queries:
+            timings = []
+            n_rows = 0
+            for i in range(args.repeat + 1):
+                t0 = time.perf_counter()
+                n_rows = 0
+                for stmt, params in q.statements:
+                    n_rows += len(conn.execute(stmt, params).fetchall())
+                if i:  # the first run warms the cache
+                    timings.append((time.perf_counter() - t0) * 1000.0)
+            entry = {"median": statistics.median(timings), "min": min(timings), "max": max(timings), "rows": n_rows}
+            report["queries"][q.name] = entry
+            print(f"{q.name:<44}{entry['median']:10.2f}{entry['min']:10.2f}{entry['max']:10.2f}{n_rows:9d}")
+    if args.report_json:
+        with open(args.report_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.report_json}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Generate synthetic activity history in a scratch Postgres and benchmark the hot queries")
+    ap.add_argument("--rows", type=int, default=0, help="UserActivity rows to generate (default: 0 = none)")
+    ap.add_argument("--guilds", type=int, default=200, help="Number of guilds (default: 200)")
+    ap.add_argument("--users", type=int, default=100_000, help="Number of users (default: 100000)")
+    ap.add_argument("--days", type=int, default=365, help="Days of history ending now (default: 365)")
+    ap.add_argument("--guild-skew", type=float, default=1.2, help="Zipf exponent of guild sizes; higher = bigger whales (default: 1.2)")
+    ap.add_argument("--user-skew", type=float, default=1.1, help="Zipf exponent of author activity inside a guild (default: 1.1)")
+    ap.add_argument("--member-share", type=float, default=0.5, help="Share of all users that are members of the biggest guild (default: 0.5)")
+    ap.add_argument("--diurnal", type=float, default=0.6, help="Amplitude of the daily activity curve, 0..0.95 (default: 0.6)")
+    ap.add_argument("--dup-rate", type=float, default=0.03, help="Share of messages repeating the author's previous one (default: 0.03)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel COPY processes (default: CPU count)")
+    ap.add_argument("--chunk-rows", type=int, default=500_000, help="Rows per work unit (default: 500000)")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed; same seed and options give the same data (default: 1)")
+    ap.add_argument("--defer-indexes", action="store_true", help="Drop secondary UserActivity indexes during the load and rebuild them after")
+    ap.add_argument("--rollup", action="store_true", help="Backfill UserActivityDaily for the generated guilds")
+    ap.add_argument("--reset", action="store_true", help="Delete previously generated data (synthetic id ranges only) first")
+    ap.add_argument("--bench", action="store_true", help="Time the hot queries (after generating, if --rows is given)")
+    ap.add_argument("--repeat", type=int, default=5, help="With --bench, timed runs per query after one warm-up (default: 5)")
+    ap.add_argument("--explain", action="store_true", help="With --bench, print EXPLAIN (ANALYZE, BUFFERS) instead of timings")
+    ap.add_argument("--report-json", type=str, default=None, help="With --bench, write the timings to this JSON file")
+    ap.add_argument("--dsn", type=str, default=None, help="Connection string of the scratch database (default: DB_CONNECTION_STRING)")
+    args = ap.parse_args(argv)
+
+    if not (args.rows or args.reset or args.bench):
+        ap.error("nothing to do: give --rows, --reset and/or --bench")
+    if args.rows < 0 or args.guilds < 1 or args.users < 1 or args.days < 1 or args.repeat < 1:
+        ap.error("--rows must be >= 0 and --guilds, --users, --days, --repeat >= 1")
+    if not 0.0 <= args.diurnal <= 0.95:
+        ap.error("--diurnal must be between 0 and 0.95")
+    if not 0.0 < args.member_share <= 1.0:
+        ap.error("--member-share must be in (0, 1]")
+    args.workers = max(1, args.workers)
+
+    dsn = args.dsn or load_connection_string()
+    if not dsn:
+        print("DB_CONNECTION_STRING not set; provide .env, environment or --dsn", file=sys.stderr)
+        return 2
+    try:
+        args.window_minutes = int(os.getenv("ACTIVITY_SIMILARITY_WINDOW_MINUTES", "10"))
+    except Exception:
+        args.window_minutes = 10
+    args.end = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+    args.start = args.end - dt.timedelta(days=args.days)
+
+    try:
+        if args.reset:
+            with psycopg.connect(dsn, autocommit=True) as conn:
+                reset_synthetic(conn)
+        if args.rows:
+            rc = generate(dsn, args)
+            if rc:
+                return rc
+        if args.bench:
+            return run_bench(dsn, args)
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,20 +5,28 @@ Generate a Markdown file listing bot commands by scanning C# source in Modules/.
 Usage:
     python tools\generate_commands_md.py            # writes COMMANDS.md in repo root
     python tools\generate_commands_md.py out.md    # write to custom path
+    python tools\generate_commands_md.py --split   # one file per module + index.md in docs\commands
+    python tools\generate_commands_md.py --split out_dir
 
 Notes:
  - This script uses simple parsing (regex) of C# source files in Modules/.
  - It extracts attributes: [Command("name")], [Alias(...)] and [Summary("...")]
  - It extracts the method signature line to list parameters (marks optional if default present).
  - It's intentionally tolerant but not a full C# parser; it should work on the project's typical formatting.
+ - Files are only rewritten when their content changed (sha256), so unchanged pages keep their mtime.
+   With --split, pages of modules that no longer exist are removed if the previous index.md linked them;
+   other files in the directory are never touched.
 """
 import sys
 import re
+import hashlib
 from pathlib import Path
 
 
 MODULES_DIR = Path(__file__).resolve().parents[1] / 'Modules'
 OUT_DEFAULT = Path(__file__).resolve().parents[1] / 'COMMANDS.md'
+SPLIT_DIR_DEFAULT = Path(__file__).resolve().parents[1] / 'docs' / 'commands'
+GENERATED_NOTE = 'auto-generated by `tools/generate_commands_md.py`'
 
 
 def parse_attributes(attr_block: str):
@@ -180,17 +188,63 @@ def extract_methods_from_file(path: Path):
     return results
 
 
+def group_by_module(commands_info):
+    by_module = {}
+    for c in commands_info:
+        by_module.setdefault(c['class'], []).append(c)
+    return by_module
+
+
+def module_heading(module, infos):
+    module_display = module.replace("Module", "")
+    module_count = len(infos)
+    module_label = 'command' if module_count == 1 else 'commands'
+    return f'{module_display} ({module_count} {module_label})'
+
+
+def render_module(infos, level=3):
+    # Markdown for the commands of one module; command headings at the given level
+    out = []
+    for info in sorted(infos, key=lambda x: x['command'] or x['method']):
+        cmd = info['command'] or info['method']
+        aliases = ', '.join(info['aliases']) if info['aliases'] else '(none)'
+        summary = info['summary'] or 'No description available.'
+        out.append(f'{"#" * level} `{cmd}`')
+        out.append('')
+        out.append(f'- Source: `{info["source"]}`')
+        out.append(f'- Aliases: {aliases}')
+        out.append(f'- Summary: {summary}')
+        if info.get('hidden'):
+            out.append(f'- Hidden: Yes')
+        if info.get('rate_limit'):
+            out.append(f'- Rate limit: {info.get("rate_limit")}')
+        if info.get('required_permission'):
+            out.append(f'- Required permission: {info.get("required_permission")}')
+        if info.get('required_bot_permission'):
+            out.append(f'- Required bot permission: {info.get("required_bot_permission")}')
+        if info.get('requires_guild_context'):
+            out.append(f'- Requires guild context: Yes')
+        # Requires DB guild output removed
+        if info['params']:
+            out.append('- Parameters:')
+            for p in info['params']:
+                opt = 'Optional' if p['optional'] else 'Required'
+                pname = p['name'] or p['raw']
+                ptype = p['type']
+                out.append(f'  - `{pname}` — {ptype} — {opt}')
+        out.append('')
+    return out
+
+
 def generate_markdown(commands_info):
     out = []
     out.append('# Commands')
     out.append('')
-    out.append('This file is auto-generated by `tools/generate_commands_md.py`.')
+    out.append(f'This file is {GENERATED_NOTE}.')
     out.append('')
 
     # Group by module/class and show totals
-    by_module = {}
-    for c in commands_info:
-        by_module.setdefault(c['class'], []).append(c)
+    by_module = group_by_module(commands_info)
     total_commands = len(commands_info)
     total_modules = len(by_module)
     out.append(f'- Total modules: {total_modules}')
@@ -198,45 +252,74 @@ def generate_markdown(commands_info):
     out.append('')
 
     for module in sorted(by_module.keys()):
-        module_display = module.replace("Module", "")
-        module_count = len(by_module[module])
-        module_label = 'command' if module_count == 1 else 'commands'
-        out.append(f'## {module_display} ({module_count} {module_label})')
+        out.append(f'## {module_heading(module, by_module[module])}')
         out.append('')
-        for info in sorted(by_module[module], key=lambda x: x['command'] or x['method']):
-            cmd = info['command'] or info['method']
-            aliases = ', '.join(info['aliases']) if info['aliases'] else '(none)'
-            summary = info['summary'] or 'No description available.'
-            out.append(f'### `{cmd}`')
-            out.append('')
-            out.append(f'- Source: `{info["source"]}`')
-            out.append(f'- Aliases: {aliases}')
-            out.append(f'- Summary: {summary}')
-            if info.get('hidden'):
-                out.append(f'- Hidden: Yes')
-            if info.get('rate_limit'):
-                out.append(f'- Rate limit: {info.get("rate_limit")}')
-            if info.get('required_permission'):
-                out.append(f'- Required permission: {info.get("required_permission")}')
-            if info.get('required_bot_permission'):
-                out.append(f'- Required bot permission: {info.get("required_bot_permission")}')
-            if info.get('requires_guild_context'):
-                out.append(f'- Requires guild context: Yes')
-            # Requires DB guild output removed
-            if info['params']:
-                out.append('- Parameters:')
-                for p in info['params']:
-                    opt = 'Optional' if p['optional'] else 'Required'
-                    pname = p['name'] or p['raw']
-                    ptype = p['type']
-                    out.append(f'  - `{pname}` — {ptype} — {opt}')
-            out.append('')
+        out.extend(render_module(by_module[module]))
 
     return '\n'.join(out)
 
 
+def generate_shards(commands_info):
+    # file name -> Markdown: one page per module class plus index.md with the totals
+    by_module = group_by_module(commands_info)
+    shards = {}
+    index = [
+        '# Commands',
+        '',
+        f'This file is {GENERATED_NOTE}.',
+        '',
+        f'- Total modules: {len(by_module)}',
+        f'- Total commands: {len(commands_info)}',
+        '',
+    ]
+    for module in sorted(by_module.keys()):
+        name = module.replace("Module", "") + '.md'
+        out = [f'# {module_heading(module, by_module[module])}', '', f'This file is {GENERATED_NOTE}.', '']
+        out.extend(render_module(by_module[module], level=2))
+        shards[name] = '\n'.join(out)
+        index.append(f'- [{module_heading(module, by_module[module])}]({name})')
+    index.append('')
+    shards['index.md'] = '\n'.join(index)
+    return shards
+
+
+def write_if_changed(path: Path, content: str):
+    # Compare content hashes and leave the file (and its mtime) alone when nothing changed
+    data = content.encode('utf-8')
+    if path.exists() and hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest():
+        return False
+    path.write_bytes(data)
+    return True
+
+
+def previous_shards(out_dir: Path):
+    # Module pages the last --split run wrote, taken from the links of its index.md
+    index = out_dir / 'index.md'
+    if not index.exists():
+        return []
+    return re.findall(r'^- \[.*\]\(([^()/\\]+\.md)\)$', index.read_text(encoding='utf-8'), re.M)
+
+
+def write_shards(out_dir: Path, shards):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = previous_shards(out_dir)
+    written = [name for name, content in shards.items() if write_if_changed(out_dir / name, content)]
+    # pages of removed or renamed modules; only files the previous index listed
+    removed = []
+    for name in sorted(set(previous) - set(shards)):
+        stale = out_dir / name
+        if stale.exists():
+            stale.unlink()
+            removed.append(name)
+    return written, removed
+
+
 def main():
-    out_path = Path(sys.argv[1]) if len(sys.argv) > 1 else OUT_DEFAULT
+    split = len(sys.argv) > 1 and sys.argv[1] == '--split'
+    if split:
+        out_path = Path(sys.argv[2]) if len(sys.argv) > 2 else SPLIT_DIR_DEFAULT
+    else:
+        out_path = Path(sys.argv[1]) if len(sys.argv) > 1 else OUT_DEFAULT
 
     if not MODULES_DIR.exists():
         print(f"Modules directory not found at {MODULES_DIR}")
@@ -246,9 +329,21 @@ def main():
     for cs in sorted(MODULES_DIR.rglob('*.cs')):
         commands.extend(extract_methods_from_file(cs))
 
+    if split:
+        shards = generate_shards(commands)
+        written, removed = write_shards(out_path, shards)
+        print(f'Wrote {len(written)} of {len(shards)} file(s) to {out_path}, removed {len(removed)}')
+        for name in written:
+            print(f'  updated {name}')
+        for name in removed:
+            print(f'  removed {name}')
+        return
+
     md = generate_markdown(commands)
-    out_path.write_text(md, encoding='utf-8')
-    print(f'Wrote {out_path}')
+    if write_if_changed(out_path, md):
+        print(f'Wrote {out_path}')
+    else:
+        print(f'{out_path} is up to date')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+r"""
+Monthly range partitioning for UserActivity: converts the table into one partitioned by
+InsertDate (a partition per UTC month) while the bot keeps running, creates the months
+ahead for the bot's live inserts, and lists the partitions.
+
+Usage (Windows PowerShell):
+  python Tools\partition_useractivity.py --migrate
+  python Tools\partition_useractivity.py --migrate --chunk-days 3 --months-ahead 6
+  python Tools\partition_useractivity.py --premake
+  python Tools\partition_useractivity.py --status
+
+Migrate:
+  A new table "UserActivity_part" is created PARTITION BY RANGE ("InsertDate") with the
+  same columns and defaults, partitions for every month from the oldest row through
+  --months-ahead months ahead, and primary key ("Id", "InsertDate") (a partitioned table's
+  unique keys must include the partition key). "Id" takes its values from a sequence
+  instead of an identity (PostgreSQL before 17 has no identity on partitioned tables);
+  inserts that leave it out keep working. Rows up to the Id high-water mark taken at the
+  start are copied on the server with INSERT ... SELECT, --chunk-days of one month at a
+  time straight into that month's partition, each chunk its own transaction; an
+  interrupted run continues after the last finished chunk (progress is kept in the new
+  table's comment). Then the old table's indexes are built on the new one and its
+  foreign keys added, validated per partition first so the referenced Guilds/Users are
+  only locked briefly. Rows the bot inserted meanwhile are copied in catch-up passes, and
+  a last short transaction locks the old table, copies what is left, renames it to
+  "UserActivity_unpartitioned" (its indexes get an _old suffix), renames the new table
+  and its indexes into place and moves the sequence past the highest Id. Reads and writes
+  of UserActivity wait for that transaction only. Every lock on UserActivity (also the
+  brief SHARE lock that reads the high-water mark) gives up after --lock-timeout-ms so
+  the bot's inserts never queue behind it for longer; if the swap's lock or the first
+  high-water mark cannot be had, nothing changes and you run again. Drop "UserActivity_unpartitioned" once you are happy.
+
+  Updates and deletes of already copied rows while the migration runs (guilds or users
+  deleted with cascade) are not carried over. EF Core keeps working against the new
+  table, but later migrations that alter UserActivity have to be written for a
+  partitioned table. Grants on the old table are not copied.
+
+Premake:
+  The bot inserts through the parent, so the current and coming months must exist:
+  --premake creates the partitions through --months-ahead months ahead (run it monthly,
+  e.g. from a scheduled task). import_dc_json.py creates the months of the messages it
+  imports and COPYs each month straight into its partition.
+
+Environment:
+  Reads DB_CONNECTION_STRING from .env in repo root or process env, like import_dc_json.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+try:
+    import psycopg
+    from psycopg import errors, sql
+except Exception:  # pragma: no cover
+    print("psycopg is required. Install with: pip install psycopg[binary]", file=sys.stderr)
+    raise
+
+from import_dc_json import (
+    ActivityPartitions,
+    activity_partition_name,
+    load_connection_string,
+    month_start,
+    next_month,
+    progress_printer,
+)
+
+
+OLD = "UserActivity"
+NEW = "UserActivity_part"
+RETIRED = "UserActivity_unpartitioned"
+NEW_SEQ = "UserActivity_part_Id_seq"
+
+COMMENT_RE = re.compile(r"^partition_useractivity: hw=(\d+) done=(\S+)$")
+
+TABLE_KIND_SQL = "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(%s)"
+
+COLUMNS_SQL = """
+    SELECT attname FROM pg_attribute
+    WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+    ORDER BY attnum
+"""
+
+INDEXES_SQL = """
+    SELECT i.relname, pg_get_indexdef(ix.indexrelid), ix.indisprimary, ix.indisunique
+    FROM pg_index ix JOIN pg_class i ON i.oid = ix.indexrelid
+    WHERE ix.indrelid = to_regclass(%s)
+    ORDER BY i.relname
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+    WHERE conrelid = to_regclass(%s) AND contype = 'f'
+    ORDER BY conname
+"""
+
+REFERENCING_SQL = """
+    SELECT conrelid::regclass::text, conname FROM pg_constraint
+    WHERE confrelid = to_regclass('"UserActivity"') AND contype = 'f'
+"""
+
+PARTITIONS_OF_SQL = """
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+    ORDER BY c.relname
+"""
+
+STATUS_SQL = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass('"UserActivity"')
+    ORDER BY c.relname
+"""
+
+
+def quoted(name: str) -> str:
+    """Name as to_regclass() wants it (mixed case)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_kind(conn: psycopg.Connection, name: str) -> Optional[str]:
+    row = conn.execute(TABLE_KIND_SQL, (quoted(name),)).fetchone()
+    return row[0] if row else None
+
+
+def suffixed(name: str, suffix: str) -> str:
+    """name + suffix within PostgreSQL's 63 byte identifier limit."""
+    return name[: 63 - len(suffix)] + suffix
+
+
+def month_ranges(first: dt.datetime, last: dt.datetime) -> List[Tuple[dt.datetime, dt.datetime]]:
+    out = []
+    m = month_start(first)
+    while m <= last:
+        out.append((m, next_month(m)))
+        m = next_month(m)
+    return out
+
+
+def plan_chunks(first: dt.datetime, last: dt.datetime, chunk_days: int) -> List[Tuple[dt.datetime, dt.datetime]]:
+    """[lo, hi) copy chunks of at most chunk_days, none crossing a month boundary."""
+    chunks = []
+    step = dt.timedelta(days=chunk_days)
+    for lo, end in month_ranges(first, last):
+        while lo < end:
+            chunks.append((lo, min(lo + step, end)))
+            lo += step
+    return chunks
+
+
+def set_lock_timeout(conn: psycopg.Connection, lock_timeout_ms: int):
+    conn.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(f"{int(lock_timeout_ms)}ms")))
+
+
+def high_water_mark(conn: psycopg.Connection, lock_timeout_ms: int, attempts: int = 3) -> int:
+    """Highest committed Id of the old table.
+
+    The SHARE lock waits for in-flight inserts to commit, so no row with a lower Id
+    can appear afterwards; it is released right away. While it is queued the bot's
+    inserts queue behind it, so it gives up after lock_timeout_ms and retries after a
+    pause; LockNotAvailable is raised once all attempts timed out (a long transaction,
+    e.g. an import, holds the table).
+    """
+    attempt = 0
+    while True:
+        try:
+            with conn.transaction():
+                set_lock_timeout(conn, lock_timeout_ms)
+                conn.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(sql.Identifier(OLD)))
+                return int(conn.execute(sql.SQL('SELECT coalesce(max("Id"), 0) FROM {}').format(sql.Identifier(OLD))).fetchone()[0])
+        except errors.LockNotAvailable:
+            attempt += 1
+            if attempt >= attempts:
+                raise
+            time.sleep(2 ** (attempt - 1))
+
+
+def read_progress(conn: psycopg.Connection) -> Tuple[int, dt.datetime]:
+    comment = conn.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (quoted(NEW),)).fetchone()[0]
+    m = COMMENT_RE.match(comment or "")
+    if not m:
+        raise RuntimeError(f'"{NEW}" exists but was not created by this tool; drop it or rename it first')
+    return int(m.group(1)), dt.datetime.fromisoformat(m.group(2))
+
+
+def write_progress(conn: psycopg.Connection, hw: int, done: dt.datetime):
+    conn.execute(
+        sql.SQL("COMMENT ON TABLE {} IS {}").format(
+            sql.Identifier(NEW), sql.Literal(f"partition_useractivity: hw={hw} done={done.isoformat()}")
+        )
+    )
+
+
+def create_new_table(conn: psycopg.Connection, first: dt.datetime, last: dt.datetime, hw: int):
+    new, seq = sql.Identifier(NEW), sql.Identifier(NEW_SEQ)
+    with conn.transaction():
+        conn.execute(
+            sql.SQL('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ("InsertDate")').format(
+                new, sql.Identifier(OLD)
+            )
+        )
+        conn.execute(sql.SQL('CREATE SEQUENCE {} AS bigint OWNED BY {}."Id"').format(seq, new))
+        conn.execute(sql.SQL('ALTER TABLE {} ALTER COLUMN "Id" SET DEFAULT nextval({})').format(new, sql.Literal(quoted(NEW_SEQ))))
+        ensure_months(conn, first, last)
+        write_progress(conn, hw, first - dt.timedelta(microseconds=1))
+
+
+def ensure_months(conn: psycopg.Connection, first: dt.datetime, last: dt.datetime):
+    """Partitions of the new table for the months from first through last."""
+    for lo, hi in month_ranges(first, last):
+        conn.execute(
+            sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+                sql.Identifier(activity_partition_name(lo, hi)), sql.Identifier(NEW), sql.Literal(lo), sql.Literal(hi)
+            )
+        )
+
+
+def copy_chunks(conn: psycopg.Connection, columns: sql.Composable, hw: int, done: dt.datetime, chunk_days: int) -> int:
+    """Copy rows with Id <= hw chunk by chunk into their partition; returns rows copied."""
+    lo, hi = conn.execute(
+        sql.SQL('SELECT min("InsertDate"), max("InsertDate") FROM {} WHERE "Id" <= %s').format(sql.Identifier(OLD)), (hw,)
+    ).fetchone()
+    if lo is None:
+        return 0
+    # rows dated past --months-ahead (clock skew) still need a partition
+    ensure_months(conn, lo, hi)
+    chunks = [c for c in plan_chunks(lo, hi, chunk_days) if c[1] > done]
+    draw_progress = progress_printer(len(chunks), "chunks")
+    copied = 0
+    t0 = time.time()
+    for i, (c_lo, c_hi) in enumerate(chunks):
+        part = sql.Identifier(activity_partition_name(month_start(c_lo), next_month(month_start(c_lo))))
+        with conn.transaction():
+            cur = conn.execute(
+                sql.SQL('INSERT INTO {} ({}) SELECT {} FROM {} WHERE "InsertDate" >= %s AND "InsertDate" < %s AND "Id" <= %s').format(
+                    part, columns, columns, sql.Identifier(OLD)
+                ),
+                (max(c_lo, done), c_hi, hw),
+            )
+            copied += max(cur.rowcount, 0)
+            write_progress(conn, hw, c_hi)
+        draw_progress(i + 1)
+    if chunks:
+        sys.stdout.write("\n")
+        print(f"Copied {copied} row(s) in {len(chunks)} chunk(s) in {time.time() - t0:.1f}s")
+    return copied
+
+
+def build_indexes(conn: psycopg.Connection) -> List[Tuple[str, str]]:
+    """Build the old table's indexes on the new one; returns (old name, new name) pairs."""
+    pairs = []
+    new = sql.Identifier(NEW)
+    existing = {name for name, *_ in conn.execute(INDEXES_SQL, (quoted(NEW),)).fetchall()}
+    for name, indexdef, primary, unique in conn.execute(INDEXES_SQL, (quoted(OLD),)).fetchall():
+        new_name = suffixed(name, "_part")
+        if primary:
+            if new_name not in existing:
+                t0 = time.time()
+                conn.execute(
+                    sql.SQL('ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ("Id", "InsertDate")').format(new, sql.Identifier(new_name))
+                )
+                print(f"Built primary key {new_name} in {time.time() - t0:.1f}s")
+            pairs.append((name, new_name))
+            continue
+        m = re.search(r" ON (?:ONLY )?\S+ (USING .*)$", indexdef)
+        if m is None:
+            print(f"WARNING: cannot rebuild index {name}: {indexdef}", file=sys.stderr)
+            continue
+        if unique and "InsertDate" not in m.group(1):
+            print(f"WARNING: unique index {name} does not include InsertDate and cannot be partitioned; skipped", file=sys.stderr)
+            continue
+        if new_name not in existing:
+            t0 = time.time()
+            conn.execute(
+                sql.SQL("CREATE {}INDEX {} ON {} {}").format(
+                    sql.SQL("UNIQUE " if unique else ""), sql.Identifier(new_name), new, sql.SQL(m.group(1))
+                )
+            )
+            print(f"Built index {new_name} in {time.time() - t0:.1f}s")
+        pairs.append((name, new_name))
+    return pairs
+
+
+def add_foreign_keys(conn: psycopg.Connection):
+    """The old table's foreign keys on the new one.
+
+    Adding them to the partitioned table directly would validate every partition while
+    holding SHARE ROW EXCLUSIVE on Guilds/Users, blocking the bot's inserts there. Each
+    partition gets the constraint NOT VALID and validated (which only needs ROW SHARE on
+    the referenced table); the parent's constraint then adopts them without a rescan.
+    """
+    present = {name for name, _ in conn.execute(FOREIGN_KEYS_SQL, (quoted(NEW),)).fetchall()}
+    parts = [r[0] for r in conn.execute(PARTITIONS_OF_SQL, (quoted(NEW),)).fetchall()]
+    for name, definition in conn.execute(FOREIGN_KEYS_SQL, (quoted(OLD),)).fetchall():
+        if name in present:
+            continue
+        t0 = time.time()
+        for part in parts:
+            if conn.execute("SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(%s) AND conname = %s", (quoted(part), name)).fetchone():
+                continue
+            conn.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} NOT VALID").format(sql.Identifier(part), sql.Identifier(name), sql.SQL(definition)))
+            conn.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}").format(sql.Identifier(part), sql.Identifier(name)))
+        conn.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(sql.Identifier(NEW), sql.Identifier(name), sql.SQL(definition)))
+        print(f"Added foreign key {name} in {time.time() - t0:.1f}s")
+
+
+def catch_up(conn: psycopg.Connection, columns: sql.Composable, after: int, upto: Optional[int] = None) -> int:
+    """Copy rows with after < Id <= upto (no upper bound when None) through the new parent."""
+    bound = sql.SQL(' AND "Id" <= {}').format(sql.Literal(upto)) if upto is not None else sql.SQL("")
+    cur = conn.execute(
+        sql.SQL('INSERT INTO {} ({}) SELECT {} FROM {} WHERE "Id" > %s{} ORDER BY "Id"').format(
+            sql.Identifier(NEW), columns, columns, sql.Identifier(OLD), bound
+        ),
+        (after,),
+    )
+    return max(cur.rowcount, 0)
+
+
+def swap(conn: psycopg.Connection, columns: sql.Composable, hw: int, index_pairs: List[Tuple[str, str]], lock_timeout_ms: int) -> int:
+    """Lock the old table, copy the last rows and rename both tables; returns rows copied."""
+    old_seq = conn.execute("SELECT pg_get_serial_sequence(%s, 'Id')", (quoted(OLD),)).fetchone()[0]
+    with conn.transaction():
+        set_lock_timeout(conn, lock_timeout_ms)
+        conn.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(sql.Identifier(OLD)))
+        # under the lock, so no row can arrive for a month created too late
+        ensure_months_of_new_rows(conn, hw)
+        copied = catch_up(conn, columns, hw)
+        for old_name, _new_name in index_pairs:
+            conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(old_name), sql.Identifier(suffixed(old_name, "_old"))))
+        conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(OLD), sql.Identifier(RETIRED)))
+        # sequence names are only cosmetic; keep whichever name is taken already
+        if old_seq and table_kind(conn, f"{RETIRED}_Id_seq") is None:
+            conn.execute(sql.SQL("ALTER SEQUENCE {} RENAME TO {}").format(sql.SQL(old_seq), sql.Identifier(f"{RETIRED}_Id_seq")))
+        conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(NEW), sql.Identifier(OLD)))
+        for old_name, new_name in index_pairs:
+            conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(new_name), sql.Identifier(old_name)))
+        if table_kind(conn, f"{OLD}_Id_seq") is None:
+            conn.execute(sql.SQL("ALTER SEQUENCE {} RENAME TO {}").format(sql.Identifier(NEW_SEQ), sql.Identifier(f"{OLD}_Id_seq")))
+        conn.execute(
+            sql.SQL('SELECT setval(pg_get_serial_sequence({}, {}), (SELECT coalesce(max("Id"), 0) + 1 FROM {}), false)').format(
+                sql.Literal(quoted(OLD)), sql.Literal("Id"), sql.Identifier(OLD)
+            )
+        )
+        conn.execute(sql.SQL("COMMENT ON TABLE {} IS NULL").format(sql.Identifier(OLD)))
+    return copied
+
+
+def migrate(dsn: str, chunk_days: int, months_ahead: int, lock_timeout_ms: int) -> int:
+    t_all = time.time()
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        kind = table_kind(conn, OLD)
+        if kind == "p":
+            print("UserActivity is partitioned already")
+            return 0
+        if kind != "r":
+            print("UserActivity not found", file=sys.stderr)
+            return 2
+        if table_kind(conn, RETIRED) is not None:
+            print(f'"{RETIRED}" exists from an earlier migration; drop it first', file=sys.stderr)
+            return 2
+        referencing = conn.execute(REFERENCING_SQL).fetchall()
+        if referencing:
+            names = ", ".join(f"{t}.{c}" for t, c in referencing)
+            print(f"Foreign keys reference UserActivity ({names}); a partitioned table cannot keep them", file=sys.stderr)
+            return 2
+        columns = sql.SQL(", ").join(sql.Identifier(r[0]) for r in conn.execute(COLUMNS_SQL, (quoted(OLD),)).fetchall())
+
+        if table_kind(conn, NEW) is None:
+            try:
+                hw = high_water_mark(conn, lock_timeout_ms)
+            except errors.LockNotAvailable:
+                print(f"Could not lock UserActivity within {lock_timeout_ms} ms to read its last Id; run again", file=sys.stderr)
+                return 1
+            first = conn.execute(sql.SQL('SELECT min("InsertDate") FROM {}').format(sql.Identifier(OLD))).fetchone()[0]
+            now = dt.datetime.now(dt.timezone.utc)
+            first = first or now
+            last = month_start(now)
+            for _ in range(months_ahead):
+                last = next_month(last)
+            create_new_table(conn, first, last, hw)
+            print(f"Created {NEW} with {len(month_ranges(first, last))} monthly partition(s), copying rows with Id <= {hw}")
+            done = first - dt.timedelta(microseconds=1)
+        else:
+            hw, done = read_progress(conn)
+            print(f"Resuming: rows with Id <= {hw} copied through {done:%Y-%m-%d %H:%M}")
+
+        copy_chunks(conn, columns, hw, done, chunk_days)
+        index_pairs = build_indexes(conn)
+        add_foreign_keys(conn)
+        conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(NEW)))
+
+        # catch up in passes while the bot keeps inserting, so the locked swap has little left to copy
+        for _ in range(3):
+            try:
+                upto = high_water_mark(conn, lock_timeout_ms)
+            except errors.LockNotAvailable:
+                # the swap copies the rest under its own lock
+                break
+            if upto <= hw:
+                break
+            t0 = time.time()
+            with conn.transaction():
+                ensure_months_of_new_rows(conn, hw)
+                n = catch_up(conn, columns, hw, upto)
+                write_progress(conn, upto, dt.datetime.now(dt.timezone.utc))
+            print(f"Caught up {n} row(s) inserted meanwhile in {time.time() - t0:.1f}s")
+            hw = upto
+
+        t0 = time.time()
+        try:
+            n = swap(conn, columns, hw, index_pairs, lock_timeout_ms)
+        except errors.LockNotAvailable:
+            print(f"Could not lock UserActivity within {lock_timeout_ms} ms; nothing was swapped, run again", file=sys.stderr)
+            return 1
+        print(f"Swapped tables in {time.time() - t0:.2f}s ({n} last row(s) copied under the lock)")
+    print(f'Done in {time.time() - t_all:.1f}s. The old table is "{RETIRED}"; drop it when no longer needed.')
+    return 0
+
+
+def ensure_months_of_new_rows(conn: psycopg.Connection, hw: int):
+    """Partitions for the rows the bot inserted after hw (normally their months exist)."""
+    lo, hi = conn.execute(
+        sql.SQL('SELECT min("InsertDate"), max("InsertDate") FROM {} WHERE "Id" > %s').format(sql.Identifier(OLD)), (hw,)
+    ).fetchone()
+    if lo is not None:
+        ensure_months(conn, lo, hi)
+
+
+def premake_months(dsn: str, months: int) -> int:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        partitions = ActivityPartitions.detect(conn)
+        if partitions is None:
+            print("UserActivity is not partitioned; run --migrate first", file=sys.stderr)
+            return 2
+        if partitions.opaque:
+            print("UserActivity has a DEFAULT or unbounded partition; not creating months", file=sys.stderr)
+            return 1
+        now = dt.datetime.now(dt.timezone.utc)
+        last = month_start(now)
+        for _ in range(months):
+            last = next_month(last)
+        created = partitions.ensure(conn, now, last)
+    if created:
+        print(f"Created {', '.join(p.name for p in created)}")
+    else:
+        print(f"All months through {last:%Y-%m} exist")
+    return 0
+
+
+def status(dsn: str) -> int:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if table_kind(conn, OLD) != "p":
+            print("UserActivity is not partitioned")
+            return 0
+        rows = conn.execute(STATUS_SQL).fetchall()
+    total_rows = total_bytes = 0
+    for name, bound, est, size in rows:
+        # reltuples is -1 until the partition was first vacuumed or analyzed
+        print(f"{name:<28} {est if est >= 0 else '?':>12} rows {size / 1e6:>10.1f} MB  {bound}")
+        total_rows += max(est, 0)
+        total_bytes += size
+    print(f"{len(rows)} partition(s), ~{total_rows} rows, {total_bytes / 1e6:.1f} MB")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Partition UserActivity by month and keep future months created")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--migrate", action="store_true", help="Convert UserActivity into a monthly partitioned table while the bot runs")
+    g.add_argument("--premake", action="store_true", help="Create the partitions of the current month through --months-ahead")
+    g.add_argument("--status", action="store_true", help="List the partitions with estimated rows and size")
+    ap.add_argument("--months-ahead", type=int, default=3, help="Future months to create partitions for (default: 3)")
+    ap.add_argument("--chunk-days", type=int, default=7, help="With --migrate, days of rows copied per transaction (default: 7)")
+    ap.add_argument("--lock-timeout-ms", type=int, default=5_000, help="With --migrate, give up a lock on UserActivity (high-water mark, final swap) after waiting this long (default: 5000)")
+    ap.add_argument("--dsn", type=str, default=None, help="Connection string (default: DB_CONNECTION_STRING)")
+    args = ap.parse_args(argv)
+
+    if args.chunk_days < 1 or args.months_ahead < 0:
+        ap.error("--chunk-days must be >= 1 and --months-ahead >= 0")
+    dsn = args.dsn or load_connection_string()
+    if not dsn:
+        print("DB_CONNECTION_STRING not set; provide .env, environment or --dsn", file=sys.stderr)
+        return 2
+    if args.status:
+        return status(dsn)
+    if args.migrate:
+        try:
+            return migrate(dsn, args.chunk_days, args.months_ahead, args.lock_timeout_ms)
+        except KeyboardInterrupt:
+            print("\nInterrupted; run --migrate again to continue")
+            return 130
+    return premake_months(dsn, args.months_ahead)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+r"""
+Audit and repair UserLevels against the UserActivity history: recomputes TotalXp, Level,
+UserMessageCount, UserAverageMessageLength and UserAverageMessageLengthEma for every
+(user, guild) in one streaming pass, reports the drift and optionally fixes it with a
+single set-based UPDATE.
+
+Usage (Windows PowerShell):
+  python Tools\reconcile_userlevels.py
+  python Tools\reconcile_userlevels.py --guild-id 123456789012345678 --report-csv drift.csv
+  python Tools\reconcile_userlevels.py --count xp --apply
+
+Expected values:
+  UserActivity is read ordered by (UserId, GuildId, InsertDate, Id) and merged with
+  UserLevels ordered by (UserId, GuildId); both are server-side cursors of one
+  REPEATABLE READ transaction, so they see the same snapshot and memory stays flat.
+  Per (user, guild) the messages are replayed the way ActivityLevelService applies them:
+  XP summed, Level from bot_level(), the running average and the EMA with N=500.
+  --count chooses which messages count towards UserMessageCount and the averages:
+    all  every UserActivity row, like the bot (default)
+    xp   only rows with XpGained > 0, like import_dc_json.py (update_userlevels)
+  The bot computes Level with integer division ((xp + 111) / 111 in C# long arithmetic),
+  the importer with float division; a Level that matches either is not drift, and
+  --apply writes the bot's.
+  Averages compare with a relative --float-tolerance.
+
+Report:
+  Pairs checked, drifting pairs per column, UserLevels rows missing for users with
+  history and UserLevels rows without any history (left alone: the history may have
+  been trimmed or predate UserActivity), plus the --top largest TotalXp differences.
+  --report-csv FILE lists every drifting pair with stored and expected values.
+
+Apply (--apply):
+  Corrections are binary-COPYed into a temp table and applied in one transaction with
+  one UPDATE ... FROM and one INSERT ... SELECT for missing rows. A row only changes if
+  its TotalXp and UserMessageCount still equal what the audit read, so members the bot
+  scored in the meantime are skipped (and counted) instead of being clobbered; run again
+  to pick them up.
+
+Environment:
+  Reads DB_CONNECTION_STRING from .env in repo root or process env, like import_dc_json.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import psycopg
+    from psycopg import sql
+except Exception:  # pragma: no cover
+    print("psycopg is required. Install with: pip install psycopg[binary]", file=sys.stderr)
+    raise
+
+from import_dc_json import load_connection_string, progress_printer
+from xp_scoring import calculate_level
+
+
+USER_EMA_ALPHA = 2.0 / (500.0 + 1.0)
+
+# the (UserId, GuildId, InsertDate) index gives the order
+ACTIVITY_STREAM_SQL = """
+    SELECT "UserId", "GuildId", "XpGained", "MessageLength"
+    FROM "UserActivity" {where}
+    ORDER BY "UserId", "GuildId", "InsertDate", "Id"
+"""
+LEVELS_STREAM_SQL = """
+    SELECT "UserId", "GuildId", "TotalXp", "Level", "UserMessageCount",
+        "UserAverageMessageLength", "UserAverageMessageLengthEma"
+    FROM "UserLevels" {where}
+    ORDER BY "UserId", "GuildId"
+"""
+
+FIX_TABLE = "reconcile_userlevels_fix"
+CREATE_FIX_SQL = sql.SQL("""
+    CREATE TEMP TABLE {} (
+        "UserId" integer NOT NULL,
+        "GuildId" integer NOT NULL,
+        "Missing" boolean NOT NULL,
+        "SeenTotalXp" integer NOT NULL,
+        "SeenMessageCount" integer NOT NULL,
+        "TotalXp" integer NOT NULL,
+        "Level" integer NOT NULL,
+        "UserMessageCount" integer NOT NULL,
+        "UserAverageMessageLength" double precision NOT NULL,
+        "UserAverageMessageLengthEma" double precision NOT NULL
+    ) ON COMMIT DROP
+""").format(sql.Identifier(FIX_TABLE))
+COPY_FIX_SQL = sql.SQL("COPY {} FROM STDIN (FORMAT BINARY)").format(sql.Identifier(FIX_TABLE))
+FIX_TYPES = ("int4", "int4", "bool", "int4", "int4", "int4", "int4", "int4", "float8", "float8")
+
+APPLY_UPDATE_SQL = sql.SQL("""
+    UPDATE "UserLevels" ul SET
+        "TotalXp" = f."TotalXp", "Level" = f."Level", "UserMessageCount" = f."UserMessageCount",
+        "UserAverageMessageLength" = f."UserAverageMessageLength",
+        "UserAverageMessageLengthEma" = f."UserAverageMessageLengthEma"
+    FROM {} f
+    WHERE NOT f."Missing" AND ul."UserId" = f."UserId" AND ul."GuildId" = f."GuildId"
+      AND ul."TotalXp" = f."SeenTotalXp" AND ul."UserMessageCount" = f."SeenMessageCount"
+""").format(sql.Identifier(FIX_TABLE))
+APPLY_INSERT_SQL = sql.SQL("""
+    INSERT INTO "UserLevels" (
+        "UserId", "GuildId", "Level", "TotalXp",
+        "UserMessageCount", "UserAverageMessageLength", "UserAverageMessageLengthEma"
+    )
+    SELECT "UserId", "GuildId", "Level", "TotalXp",
+        "UserMessageCount", "UserAverageMessageLength", "UserAverageMessageLengthEma"
+    FROM {} WHERE "Missing"
+    ON CONFLICT ("UserId", "GuildId") DO NOTHING
+""").format(sql.Identifier(FIX_TABLE))
+
+FIELDS = ("TotalXp", "Level", "UserMessageCount", "UserAverageMessageLength", "UserAverageMessageLengthEma")
+
+
+class Levels(NamedTuple):
+    total_xp: int
+    level: int
+    message_count: int
+    avg_length: float
+    ema_length: float
+
+
+def bot_level(total_xp: int) -> int:
+    """ActivityLevelService.CalculateLevel: (xp + 111) / 111 is long division in C#."""
+    return int(math.pow(math.log10((total_xp + 111) // 111), 5.0243))
+
+
+def replay_levels(rows: Iterator[tuple], count_all: bool) -> Iterator[Tuple[Tuple[int, int], Levels]]:
+    """Expected UserLevels per (UserId, GuildId) from activity rows sorted by user, guild and time."""
+    key: Optional[Tuple[int, int]] = None
+    total = count = 0
+    avg = ema = 0.0
+    for uid, gid, xp, length in rows:
+        if (uid, gid) != key:
+            if key is not None and count:
+                yield key, Levels(total, bot_level(total), count, avg, ema)
+            key = (uid, gid)
+            total = count = 0
+            avg = ema = 0.0
+        if not count_all and xp <= 0:
+            continue
+        total += xp
+        # ActivityLevelService.ApplyActivityToUserLevel
+        avg = (avg * count + length) / (count + 1) if count > 0 else float(length)
+        ema = float(length) if ema <= 0.0 else (1.0 - USER_EMA_ALPHA) * ema + USER_EMA_ALPHA * length
+        count += 1
+    if key is not None and count:
+        yield key, Levels(total, bot_level(total), count, avg, ema)
+
+
+def drifting_fields(stored: Levels, expected: Levels, tolerance: float) -> List[str]:
+    out = []
+    if stored.total_xp != expected.total_xp:
+        out.append("TotalXp")
+    if stored.level not in (expected.level, calculate_level(expected.total_xp)):
+        out.append("Level")
+    if stored.message_count != expected.message_count:
+        out.append("UserMessageCount")
+    if not math.isclose(stored.avg_length, expected.avg_length, rel_tol=tolerance, abs_tol=tolerance):
+        out.append("UserAverageMessageLength")
+    if not math.isclose(stored.ema_length, expected.ema_length, rel_tol=tolerance, abs_tol=tolerance):
+        out.append("UserAverageMessageLengthEma")
+    return out
+
+
+class Drift(NamedTuple):
+    user_id: int
+    guild_id: int
+    stored: Optional[Levels]  # None: UserLevels row missing
+    expected: Levels
+    fields: List[str]
+
+
+def _stream(conn: psycopg.Connection, name: str, query: str, params: tuple, itersize: int) -> Iterator[tuple]:
+    with conn.cursor(name=name, binary=True) as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
+
+
+def audit(
+    conn: psycopg.Connection, guild_id: Optional[int], count_all: bool, tolerance: float, itersize: int,
+) -> Tuple[List[Drift], Dict[str, int]]:
+    """Merge expected and stored UserLevels; returns the drifting pairs and counters."""
+    where, params = ("WHERE \"GuildId\" = %s", (guild_id,)) if guild_id is not None else ("", ())
+    total = conn.execute(f'SELECT count(*) FROM "UserActivity" {where}', params).fetchone()[0]
+    draw_progress = progress_printer(total, "rows")
+    seen = 0
+
+    def activity_rows() -> Iterator[tuple]:
+        nonlocal seen
+        for row in _stream(conn, "reconcile_activity", ACTIVITY_STREAM_SQL.format(where=where), params, itersize):
+            seen += 1
+            if not seen % 10_000:
+                draw_progress(seen)
+            yield row
+
+    levels_iter = _stream(conn, "reconcile_levels", LEVELS_STREAM_SQL.format(where=where), params, itersize)
+    stats = {"pairs": 0, "ok": 0, "missing": 0, "orphans": 0, **{f: 0 for f in FIELDS}}
+    drift: List[Drift] = []
+    stored_row = next(levels_iter, None)
+    for key, expected in replay_levels(activity_rows(), count_all):
+        stats["pairs"] += 1
+        while stored_row is not None and (stored_row[0], stored_row[1]) < key:
+            stats["orphans"] += 1
+            stored_row = next(levels_iter, None)
+        if stored_row is not None and (stored_row[0], stored_row[1]) == key:
+            stored = Levels(*stored_row[2:])
+            stored_row = next(levels_iter, None)
+            fields = drifting_fields(stored, expected, tolerance)
+            if not fields:
+                stats["ok"] += 1
+                continue
+            for f in fields:
+                stats[f] += 1
+            drift.append(Drift(key[0], key[1], stored, expected, fields))
+        else:
+            stats["missing"] += 1
+            drift.append(Drift(key[0], key[1], None, expected, list(FIELDS)))
+    while stored_row is not None:
+        stats["orphans"] += 1
+        stored_row = next(levels_iter, None)
+    draw_progress(total)
+    sys.stdout.write("\n")
+    stats["activity_rows"] = seen
+    return drift, stats
+
+
+def write_csv(path: str, drift: List[Drift]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["UserId", "GuildId", "Drift"] + [f"Stored{c}" for c in FIELDS] + [f"Expected{c}" for c in FIELDS])
+        for d in drift:
+            stored = list(d.stored) if d.stored is not None else [""] * len(FIELDS)
+            w.writerow([d.user_id, d.guild_id, " ".join(d.fields) if d.stored is not None else "missing"] + stored + list(d.expected))
+
+
+def apply_fixes(conn: psycopg.Connection, drift: List[Drift]) -> Tuple[int, int]:
+    """One transaction: COPY the corrections, UPDATE drifting rows, INSERT missing ones."""
+    with conn.transaction():
+        conn.execute(CREATE_FIX_SQL)
+        with conn.cursor() as cur:
+            with cur.copy(COPY_FIX_SQL) as copy:
+                copy.set_types(list(FIX_TYPES))
+                for d in drift:
+                    seen_total, seen_count = (d.stored.total_xp, d.stored.message_count) if d.stored is not None else (0, 0)
+                    copy.write_row((d.user_id, d.guild_id, d.stored is None, seen_total, seen_count) + tuple(d.expected))
+        updated = conn.execute(APPLY_UPDATE_SQL).rowcount
+        inserted = conn.execute(APPLY_INSERT_SQL).rowcount
+    return updated, inserted
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Recompute UserLevels from UserActivity, report drift and optionally fix it")
+    ap.add_argument("--guild-id", type=int, default=None, help="Only this guild (Discord id)")
+    ap.add_argument("--count", choices=("all", "xp"), default="all", help="Messages that count: all (bot) or only XpGained > 0 (importer) (default: all)")
+    ap.add_argument("--float-tolerance", type=float, default=1e-6, help="Relative tolerance for the averages (default: 1e-6)")
+    ap.add_argument("--top", type=int, default=10, help="Show the N largest TotalXp differences (default: 10)")
+    ap.add_argument("--report-csv", type=str, default=None, help="Write every drifting pair to this CSV file")
+    ap.add_argument("--apply", action="store_true", help="Write the expected values (one set-based UPDATE/INSERT)")
+    ap.add_argument("--fetch-rows", type=int, default=50_000, help="Rows per server-side cursor fetch (default: 50000)")
+    ap.add_argument("--dsn", type=str, default=None, help="Connection string (default: DB_CONNECTION_STRING)")
+    args = ap.parse_args(argv)
+
+    dsn = args.dsn or load_connection_string()
+    if not dsn:
+        print("DB_CONNECTION_STRING not set; provide .env, environment or --dsn", file=sys.stderr)
+        return 2
+
+    t0 = time.time()
+    with psycopg.connect(dsn) as conn:
+        guild_id = None
+        if args.guild_id is not None:
+            row = conn.execute('SELECT "Id" FROM "Guilds" WHERE "DiscordId" = %s', (args.guild_id,)).fetchone()
+            conn.rollback()
+            if row is None:
+                print(f"Guild {args.guild_id} not found", file=sys.stderr)
+                return 2
+            guild_id = row[0]
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        conn.read_only = True
+        with conn.transaction():
+            drift, stats = audit(conn, guild_id, args.count == "all", args.float_tolerance, args.fetch_rows)
+        took = time.time() - t0
+        print(
+            f"Checked {stats['pairs']} (user, guild) pairs from {stats['activity_rows']} activity rows in {took:.1f}s "
+            f"({stats['activity_rows'] / max(took, 1e-6):.0f} rows/s): {stats['ok']} ok, {len(drift)} drifting"
+        )
+        for f in FIELDS:
+            if stats[f]:
+                print(f"  {f:<30}{stats[f]:>10}")
+        if stats["missing"]:
+            print(f"  {'missing UserLevels row':<30}{stats['missing']:>10}")
+        if stats["orphans"]:
+            print(f"  {'UserLevels without history':<30}{stats['orphans']:>10}  (not changed)")
+        worst = sorted((d for d in drift if d.stored is not None), key=lambda d: -abs(d.stored.total_xp - d.expected.total_xp))
+        worst = [d for d in worst[: args.top] if d.stored.total_xp != d.expected.total_xp]
+        if worst:
+            print("Largest TotalXp drift (UserId, GuildId: stored -> expected):")
+            for d in worst:
+                print(f"  {d.user_id}, {d.guild_id}: {d.stored.total_xp} -> {d.expected.total_xp} (messages {d.stored.message_count} -> {d.expected.message_count})")
+        if args.report_csv:
+            write_csv(args.report_csv, drift)
+            print(f"Wrote {args.report_csv}")
+
+        if args.apply and drift:
+            conn.read_only = False
+            conn.isolation_level = psycopg.IsolationLevel.READ_COMMITTED
+            t1 = time.time()
+            updated, inserted = apply_fixes(conn, drift)
+            skipped = len(drift) - updated - inserted
+            print(f"Applied in {time.time() - t1:.1f}s: {updated} updated, {inserted} inserted, {skipped} skipped (changed since the audit)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
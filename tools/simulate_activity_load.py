@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+r"""
+Load generator for the live activity path: replays Discord Chat Exporter files (or
+synthetic chat) against a Postgres stand-in with the exact per-message statements of
+ActivityHandler -> ActivityScoringService.CreateActivityAsync -> ActivityLevelService,
+and reports latency percentiles and throughput.
+
+Usage (Windows PowerShell):
+  python Tools\simulate_activity_load.py --dir C:\path\to\exports --speedup 60
+  python Tools\simulate_activity_load.py --file C:\path\to\exports.zip --speedup 0 --connections 8 --limit 20000
+  python Tools\simulate_activity_load.py --synthetic --channels 50 --users 2000 --rate 300 --duration 120
+  python Tools\simulate_activity_load.py --synthetic --rate 100 --duration 60 --connections 1 --report-json before.json
+
+Per message (all timed):
+  lookups        Users and Guilds by DiscordId (UsersService/GuildService)
+  scoring reads  the author's previous UserActivity in the guild, their similarity window
+                 (newest 200 in ACTIVITY_SIMILARITY_WINDOW_MINUTES) and the guild's
+                 previous UserActivity, each its own round trip like the EF queries
+  write          READ COMMITTED transaction: UserLevels FOR UPDATE, INSERT (new member)
+                 or UPDATE UserLevels, INSERT UserActivity, COMMIT
+XP is computed in between with the shared scoring core (xp_scoring.py), InsertDate is
+the wall clock like DateTime.UtcNow in the bot. Users and guilds are created before the
+clock starts, so the run measures the steady state of known members.
+
+Traffic:
+  --file/--dir replay exports; every file is a channel and messages keep their relative
+  timing. --synthetic generates Poisson arrivals at --rate msg/s for --duration seconds
+  over --channels channels with Zipf-skewed authors (--users, --skew) and --dup-rate
+  repeated messages (which exercise the similarity penalties). Either way the timing is
+  divided by --speedup; --speedup 0 is a closed loop where --connections workers send
+  back to back, i.e. the maximum sustainable rate.
+
+Concurrency:
+  Messages are handled as they arrive on a pool of --connections connections; a message
+  waits (queue wait) when all are busy. Discord.Net awaits MessageReceived handlers on
+  its gateway task, so --connections 1 models the bot as written and larger pools model
+  a bot that hands messages to workers.
+
+Report:
+  Throughput achieved vs offered, errors and p50/p90/p99/p99.9/max per phase, plus
+  service time (connection acquired to commit) and end-to-end latency (scheduled arrival
+  to commit). A progress line shows the rate and p99 of the last --report-interval.
+  --report-json FILE keeps the numbers for comparing runs (e.g. before/after an index).
+
+WARNING: every simulated message is inserted into UserActivity and changes UserLevels.
+Point DB_CONNECTION_STRING (or --dsn) at a scratch copy of the database, never at the
+live bot's.
+
+Environment:
+  Reads DB_CONNECTION_STRING from .env in repo root or process env, like import_dc_json.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import datetime as dt
+import json
+import os
+import random
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except Exception:  # pragma: no cover
+    print("psycopg is required. Install with: pip install psycopg[binary]", file=sys.stderr)
+    raise
+
+from import_dc_json import (
+    INSERT_GUILD_SQL,
+    INSERT_USER_SQL,
+    INSERT_USERLEVELS_SQL,
+    UPDATE_USERLEVELS_SQL,
+    USERACTIVITY_COLUMNS,
+    iter_json_files,
+    iter_zip_members,
+    load_connection_string,
+    load_export,
+)
+from xp_scoring import calculate_level, compute_fingerprint, compute_xp_breakdown, next_guild_average
+
+
+# ===================== Bot statements =====================
+
+# UsersService.TryGetCreateUser / GuildService.TryGetCreateGuild (same index lookups; only the
+# columns Python can load, Users has '-infinity' timestamps datetime cannot represent)
+SELECT_USER_SQL = 'SELECT "Id", "Username", "LastUsernameCheck" FROM "Users" WHERE "DiscordId" = %s LIMIT 1'
+SELECT_GUILD_SQL = 'SELECT "Id", "Name", "LevelUpMessages", "LevelUpQuotes", "UseGlobalQuotes" FROM "Guilds" WHERE "DiscordId" = %s LIMIT 1'
+
+# ActivityScoringService.CreateActivityAsync
+PREV_USER_ACTIVITY_SQL = """
+    SELECT * FROM "UserActivity"
+    WHERE "UserId" = %s AND "GuildId" = %s
+    ORDER BY "InsertDate" DESC LIMIT 1
+"""
+RECENT_SIMILARITY_SQL = """
+    SELECT "MessageSimHash", "NormalizedLength" FROM "UserActivity"
+    WHERE "UserId" = %s AND "GuildId" = %s AND "InsertDate" >= %s
+    ORDER BY "InsertDate" DESC LIMIT 200
+"""
+PREV_GUILD_ACTIVITY_SQL = """
+    SELECT * FROM "UserActivity"
+    WHERE "GuildId" = %s
+    ORDER BY "InsertDate" DESC LIMIT 1
+"""
+
+# ActivityLevelService.RecordActivityAsync
+SELECT_USERLEVELS_FOR_UPDATE_SQL = 'SELECT * FROM "UserLevels" WHERE "UserId" = %s AND "GuildId" = %s FOR UPDATE'
+INSERT_ACTIVITY_SQL = 'INSERT INTO "UserActivity" ({}) VALUES ({}) RETURNING "Id"'.format(
+    ", ".join(f'"{c}"' for c in USERACTIVITY_COLUMNS), ", ".join(["%s"] * len(USERACTIVITY_COLUMNS))
+)
+
+USER_EMA_ALPHA = 2.0 / (500.0 + 1.0)
+
+PHASES = ("queue wait", "lookups", "scoring reads", "write", "service", "end-to-end")
+
+
+class SimMessage(NamedTuple):
+    offset: float  # seconds after the start of the run
+    guild_id: int  # Discord ids
+    channel_id: int
+    message_id: int
+    author_id: int
+    author_name: str
+    content: str
+
+
+# ===================== Traffic =====================
+
+def replay_messages(files: List, speedup: float, limit: Optional[int] = None) -> List[SimMessage]:
+    """Messages of the exports ordered by time; offsets are real gaps divided by speedup (0 = none)."""
+    raw: List[Tuple[dt.datetime, SimMessage]] = []
+    for f in files:
+        export = load_export(f)
+        for m in export.messages:
+            if m.author.is_bot:
+                continue  # ActivityHandler ignores bots
+            raw.append((m.timestamp, SimMessage(
+                0.0, int(export.guild_id), int(export.channel_id), int(m.id),
+                int(m.author.id), m.author.name, m.content,
+            )))
+    raw.sort(key=lambda r: r[0])
+    if limit is not None:
+        raw = raw[:limit]
+    if not raw:
+        return []
+    first = raw[0][0]
+    return [
+        m._replace(offset=(ts - first).total_seconds() / speedup if speedup > 0 else 0.0)
+        for ts, m in raw
+    ]
+
+
+_WORDS = (
+    "the a to and is it you that of in i for this on lol with be have not are just was what so but "
+    "do my like can at me your get if all we no one they out up he good yeah gg time now think know "
+    "game play today anyone here going really will make still more when new see why got well back"
+).split()
+
+
+def synthetic_messages(
+    channels: int, users: int, rate: float, duration: float, skew: float, dup_rate: float, rng: random.Random,
+    guild_id: int,
+) -> List[SimMessage]:
+    """Poisson arrivals at `rate` msg/s spread over channels, authors Zipf(skew) distributed."""
+    cum: List[float] = []
+    total = 0.0
+    for rank in range(1, users + 1):
+        total += 1.0 / rank ** skew
+        cum.append(total)
+    base_user = 800_000_000_000_000_000
+    base_channel = 810_000_000_000_000_000
+    # unique per run: Discord-like snowflakes from the current time
+    next_id = (int(time.time() * 1000) - 1_420_070_400_000) << 22
+    last_text: Dict[int, str] = {}
+    out: List[SimMessage] = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        author = base_user + bisect.bisect_left(cum, rng.random() * total)
+        if author in last_text and rng.random() < dup_rate:
+            content = last_text[author]
+        else:
+            content = " ".join(rng.choice(_WORDS) for _ in range(max(1, int(rng.lognormvariate(1.8, 0.8)))))
+            last_text[author] = content
+        next_id += 1
+        out.append(SimMessage(t, guild_id, base_channel + rng.randrange(channels), next_id, author, f"sim{author % 100000}", content))
+    return out
+
+
+# ===================== Simulator =====================
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/p99.9/max in milliseconds (nearest rank)."""
+    if not values:
+        return {}
+    v = sorted(values)
+    n = len(v)
+
+    def rank(p: float) -> float:
+        return v[min(n - 1, max(0, int(p * n + 0.999999) - 1))] * 1000.0
+
+    return {"p50": rank(0.50), "p90": rank(0.90), "p99": rank(0.99), "p99.9": rank(0.999), "max": v[-1] * 1000.0}
+
+
+class ActivitySimulator:
+    """Issues the bot's per-message statements for SimMessages on a pool of async connections."""
+
+    def __init__(self, dsn: str, connections: int, window_minutes: int):
+        self.dsn = dsn
+        self.n_connections = max(1, connections)
+        self.window = dt.timedelta(minutes=window_minutes)
+        self._pool: "asyncio.Queue[psycopg.AsyncConnection]" = asyncio.Queue()
+        self._conns: List[psycopg.AsyncConnection] = []
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.done = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.level_ups = 0
+
+    async def open(self):
+        for _ in range(self.n_connections):
+            conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+            self._conns.append(conn)
+            self._pool.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._conns:
+            await conn.close()
+
+    async def ensure_members(self, messages: List[SimMessage]):
+        """Create the guilds and users of the run up front (not timed)."""
+        guilds = {m.guild_id for m in messages}
+        users = {m.author_id: m.author_name for m in messages}
+        conn = self._conns[0]
+        now = dt.datetime.now(dt.timezone.utc)
+        async with conn.transaction():
+            for gid in guilds:
+                cur = await conn.execute(SELECT_GUILD_SQL, (gid,))
+                if await cur.fetchone() is None:
+                    await conn.execute(INSERT_GUILD_SQL, (gid, f"Simulated guild {gid}", "m!", now))
+            for uid, name in users.items():
+                cur = await conn.execute(SELECT_USER_SQL, (uid,))
+                if await cur.fetchone() is None:
+                    await conn.execute(INSERT_USER_SQL, (uid, name, now, now, True, True))
+
+    async def handle(self, msg: SimMessage, due: float):
+        """One MessageReceived: lookups, scoring reads, XP, level transaction."""
+        t_arrive = time.perf_counter()
+        conn = await self._pool.get()
+        t0 = time.perf_counter()
+        try:
+            cur = await conn.execute(SELECT_USER_SQL, (msg.author_id,))
+            user_id = (await cur.fetchone())[0]
+            cur = await conn.execute(SELECT_GUILD_SQL, (msg.guild_id,))
+            guild_id = (await cur.fetchone())[0]
+            t1 = time.perf_counter()
+
+            now = dt.datetime.now(dt.timezone.utc)
+            cur = conn.cursor(row_factory=dict_row)
+            await cur.execute(PREV_USER_ACTIVITY_SQL, (user_id, guild_id))
+            prev_user = await cur.fetchone()
+            await cur.execute(RECENT_SIMILARITY_SQL, (user_id, guild_id, now - self.window))
+            recent = [(int(r["MessageSimHash"]), int(r["NormalizedLength"]), None) for r in await cur.fetchall()]
+            await cur.execute(PREV_GUILD_ACTIVITY_SQL, (guild_id,))
+            prev_guild = await cur.fetchone()
+            t2 = time.perf_counter()
+
+            fp = compute_fingerprint(msg.content)
+            breakdown = compute_xp_breakdown(
+                fp, now,
+                (prev_user["Id"], prev_user["InsertDate"], prev_user["MessageHash"]) if prev_user else None,
+                recent,
+                (prev_guild["GuildAverageMessageLength"], prev_guild["GuildMessageCount"]) if prev_guild else None,
+            )
+            if prev_guild:
+                guild_avg, guild_count = next_guild_average(prev_guild["GuildAverageMessageLength"], prev_guild["GuildMessageCount"], fp.length)
+            else:
+                guild_avg, guild_count = float(fp.length), 1
+
+            activity = (
+                msg.channel_id, msg.message_id, guild_id, user_id, now,
+                fp.hash, fp.length, fp.simhash, fp.norm_len, breakdown.xp, guild_avg, guild_count,
+            )
+            try:
+                level_changed = await self._record_activity(conn, cur, activity)
+            except psycopg.errors.UniqueViolation:
+                # two first messages of a member raced on the UserLevels insert; the bot retries once
+                level_changed = await self._record_activity(conn, cur, activity)
+            t3 = time.perf_counter()
+        except psycopg.Error as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return
+        finally:
+            self._pool.put_nowait(conn)
+
+        self.done += 1
+        self.level_ups += level_changed
+        timings = self.timings
+        timings["queue wait"].append(t0 - t_arrive)
+        timings["lookups"].append(t1 - t0)
+        timings["scoring reads"].append(t2 - t1)
+        timings["write"].append(t3 - t2)
+        timings["service"].append(t3 - t0)
+        timings["end-to-end"].append(t3 - due)
+
+    @staticmethod
+    async def _record_activity(conn: psycopg.AsyncConnection, cur: psycopg.AsyncCursor, activity: tuple) -> bool:
+        """ActivityLevelService.RecordActivityAsync for one UserActivity row; returns whether the level changed."""
+        user_id, guild_id, xp, length = activity[3], activity[2], activity[9], activity[6]
+        async with conn.transaction():
+            await cur.execute(SELECT_USERLEVELS_FOR_UPDATE_SQL, (user_id, guild_id))
+            ul = await cur.fetchone()
+            if ul is None:
+                level = calculate_level(xp)
+                await cur.execute(INSERT_USERLEVELS_SQL, (user_id, guild_id, level, xp, 1, float(length), float(length)))
+                level_changed = level != 0
+            else:
+                total = ul["TotalXp"] + xp
+                level = calculate_level(total)
+                count = ul["UserMessageCount"]
+                avg = ((ul["UserAverageMessageLength"] * count) + length) / (count + 1) if count > 0 else float(length)
+                ema_prev = ul["UserAverageMessageLengthEma"]
+                ema = float(length) if ema_prev <= 0.0 else (1.0 - USER_EMA_ALPHA) * ema_prev + USER_EMA_ALPHA * length
+                await cur.execute(UPDATE_USERLEVELS_SQL, (total, level, count + 1, avg, ema, user_id, guild_id))
+                level_changed = level != ul["Level"]
+            await cur.execute(INSERT_ACTIVITY_SQL, activity)
+        return level_changed
+
+    async def run_open_loop(self, messages: List[SimMessage], report_interval: float) -> float:
+        """Send every message at start + offset, whether or not earlier ones finished."""
+        start = time.perf_counter()
+        tasks = set()
+        reporter = asyncio.create_task(self._report_progress(start, report_interval))
+        for msg in messages:
+            due = start + msg.offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.handle(msg, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        reporter.cancel()
+        return time.perf_counter() - start
+
+    async def run_closed_loop(self, messages: List[SimMessage], report_interval: float) -> float:
+        """--speedup 0: one worker per connection sends messages back to back."""
+        start = time.perf_counter()
+        it = iter(messages)
+
+        async def worker():
+            for msg in it:
+                await self.handle(msg, time.perf_counter())
+
+        reporter = asyncio.create_task(self._report_progress(start, report_interval))
+        await asyncio.gather(*(worker() for _ in range(self.n_connections)))
+        reporter.cancel()
+        return time.perf_counter() - start
+
+    async def _report_progress(self, start: float, interval: float):
+        seen = 0
+        while True:
+            await asyncio.sleep(interval)
+            e2e = self.timings["end-to-end"]
+            window = e2e[seen:]
+            seen = len(e2e)
+            p99 = percentiles(window).get("p99", 0.0)
+            sys.stdout.write(
+                f"\r[{time.perf_counter() - start:7.1f}s] done={self.done} errors={self.errors} "
+                f"rate={len(window) / interval:7.1f} msg/s p99={p99:8.1f} ms   "
+            )
+            sys.stdout.flush()
+
+
+def print_report(sim: ActivitySimulator, sent: int, elapsed: float, offered: Optional[float]) -> dict:
+    rate = sim.done / elapsed if elapsed > 0 else 0.0
+    offered_note = f" (offered {offered:.1f} msg/s)" if offered else " (closed loop)"
+    print(f"\nSent {sent} messages in {elapsed:.1f}s: {rate:.1f} msg/s{offered_note}, errors={sim.errors}, level-ups={sim.level_ups}")
+    if sim.last_error:
+        print(f"Last error: {sim.last_error}")
+    print(f"{'phase (ms)':<15}{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}{'max':>9}")
+    report = {
+        "messages": sent, "completed": sim.done, "errors": sim.errors, "elapsed_s": elapsed,
+        "throughput_msg_s": rate, "offered_msg_s": offered, "connections": sim.n_connections, "phases_ms": {},
+    }
+    for phase in PHASES:
+        p = percentiles(sim.timings[phase])
+        if not p:
+            continue
+        report["phases_ms"][phase] = p
+        print(f"{phase:<15}" + "".join(f"{p[k]:9.2f}" for k in ("p50", "p90", "p99", "p99.9", "max")))
+    return report
+
+
+async def run_simulation(dsn: str, messages: List[SimMessage], args: argparse.Namespace) -> dict:
+    sim = ActivitySimulator(dsn, args.connections, args.window_minutes)
+    await sim.open()
+    try:
+        t_prep = time.time()
+        await sim.ensure_members(messages)
+        print(f"Ensured {len({m.author_id for m in messages})} users and {len({m.guild_id for m in messages})} guild(s) in {time.time() - t_prep:.2f}s")
+        channels = len({m.channel_id for m in messages})
+        span = messages[-1].offset if messages else 0.0
+        offered = len(messages) / span if span > 0 else None
+        mode = f"offered {offered:.1f} msg/s over {span:.0f}s" if offered else "closed loop"
+        print(f"Simulating {len(messages)} messages on {channels} channel(s), {sim.n_connections} connection(s), {mode}")
+        if offered:
+            elapsed = await sim.run_open_loop(messages, args.report_interval)
+        else:
+            elapsed = await sim.run_closed_loop(messages, args.report_interval)
+        return print_report(sim, len(messages), elapsed, offered)
+    finally:
+        await sim.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Load-test the bot's activity scoring statements against a scratch Postgres")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--file", type=str, help="Replay one export (.json, .json.gz, .json.zst) or a zip archive of exports")
+    g.add_argument("--dir", type=str, help="Replay every export in a directory")
+    g.add_argument("--synthetic", action="store_true", help="Generate synthetic traffic instead of replaying exports")
+    ap.add_argument("--pattern", type=str, default="*.json", help="Filename pattern for --dir and zip members (default: *.json)")
+    ap.add_argument("--recursive", action="store_true", help="Scan --dir recursively")
+    ap.add_argument("--speedup", type=float, default=1.0, help="Send N times faster than recorded/generated; 0 = closed loop as fast as possible (default: 1)")
+    ap.add_argument("--limit", type=int, default=None, help="Only replay the first N messages")
+    ap.add_argument("--channels", type=int, default=20, help="With --synthetic, number of channels (default: 20)")
+    ap.add_argument("--users", type=int, default=500, help="With --synthetic, number of authors (default: 500)")
+    ap.add_argument("--rate", type=float, default=50.0, help="With --synthetic, messages per second (default: 50)")
+    ap.add_argument("--duration", type=float, default=60.0, help="With --synthetic, seconds of traffic (default: 60)")
+    ap.add_argument("--skew", type=float, default=1.1, help="With --synthetic, Zipf exponent of author activity (default: 1.1)")
+    ap.add_argument("--dup-rate", type=float, default=0.05, help="With --synthetic, share of messages repeating the author's last one (default: 0.05)")
+    ap.add_argument("--guild-id", type=int, default=820_000_000_000_000_000, help="With --synthetic, Discord id of the simulated guild")
+    ap.add_argument("--seed", type=int, default=None, help="With --synthetic, random seed")
+    ap.add_argument("--connections", type=int, default=10, help="Connection pool size, i.e. messages handled concurrently (default: 10)")
+    ap.add_argument("--report-interval", type=float, default=5.0, help="Seconds between progress lines (default: 5)")
+    ap.add_argument("--report-json", type=str, default=None, help="Write the summary (throughput, percentiles per phase) to this JSON file")
+    ap.add_argument("--dsn", type=str, default=None, help="Connection string of the scratch database (default: DB_CONNECTION_STRING)")
+    args = ap.parse_args(argv)
+
+    dsn = args.dsn or load_connection_string()
+    if not dsn:
+        print("DB_CONNECTION_STRING not set; provide .env, environment or --dsn", file=sys.stderr)
+        return 2
+    try:
+        args.window_minutes = int(os.getenv("ACTIVITY_SIMILARITY_WINDOW_MINUTES", "10"))
+    except Exception:
+        args.window_minutes = 10
+
+    if args.synthetic:
+        if args.rate <= 0 or args.duration <= 0:
+            print("--rate and --duration must be positive", file=sys.stderr)
+            return 2
+        rng = random.Random(args.seed)
+        messages = synthetic_messages(
+            max(1, args.channels), max(1, args.users), args.rate, args.duration,
+            args.skew, args.dup_rate, rng, args.guild_id,
+        )
+        if args.limit is not None:
+            messages = messages[: args.limit]
+        messages = [m._replace(offset=m.offset / args.speedup if args.speedup > 0 else 0.0) for m in messages]
+    else:
+        if args.file:
+            path = Path(args.file).resolve()
+            files = list(iter_zip_members(path, args.pattern)) if zipfile.is_zipfile(path) else [path]
+        else:
+            files = list(iter_json_files(Path(args.dir).resolve(), args.pattern, recursive=args.recursive))
+        print(f"Loading {len(files)} export(s)...")
+        messages = replay_messages(files, args.speedup, args.limit)
+    if not messages:
+        print("Nothing to simulate")
+        return 0
+
+    if sys.platform == "win32":
+        # psycopg's async connection does not support the Proactor event loop
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    try:
+        report = asyncio.run(run_simulation(dsn, messages, args))
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+        return 130
+    if args.report_json:
+        Path(args.report_json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {args.report_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
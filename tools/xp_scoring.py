@@ -0,0 +1,761 @@
+#!/usr/bin/env python3
+r"""
+XP scoring core shared by the Morpheus tools: SimHash/xxh64 fingerprints and the XP
+formula of ActivityHandler.cs, without a database.
+
+Usage:
+  from xp_scoring import Scorer
+  scorer = Scorer(window_minutes=10)
+  for b in scorer.score_batch([(user_id, timestamp, content), ...]):
+      print(b.xp, b.similarity_penalty_complex)
+
+Scorer keeps one guild's rolling state (guild length EMA, every author's last message
+and SimHash window), so messages must be fed in time order. Seed it from existing
+UserActivity with seed_user() and the guild_avg/guild_count arguments to continue where
+the database stops. import_dc_json.py scores through the same functions.
+
+Batch evaluation:
+  Once a message's history has been looked at, its XP depends only on XpInputs (length,
+  guild average, gap to the author's previous message, same hash, best window
+  similarity). compute_xp_batch() evaluates the formulas for a whole list of them,
+  element-wise with numpy when it is installed (pip install numpy) and with the scalar
+  code otherwise. Products within 1e-9 of an integer are recomputed with the scalar code,
+  so floor() always agrees with compute_xp_breakdown(). Scorer.score_batch_xp() and the
+  importer's parallel engine use it; check parity and speed with
+    python Tools\xp_scoring.py --self-check [--n 500000] [--no-numpy]
+
+Only the standard library is imported up front; xxhash (pip install xxhash) is loaded
+on the first message hash, numpy on the first batch, and nothing here needs psycopg.
+"""
+
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import math
+import random
+import unicodedata
+from collections import deque
+from operator import itemgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+
+class MessageFingerprint(NamedTuple):
+    """Everything the XP engine needs from a message's content."""
+    length: int  # len(content), as used for XP and the length averages
+    hash: str  # xxh64, base64 (UserActivity.MessageHash)
+    simhash: int
+    norm_len: int
+
+
+# ===================== SimHasher parity with C# =====================
+
+def normalize_text(s: str) -> str:
+    """Mirror Morpheus.Utilities.Text.SimHasher.Normalize.
+
+    Steps:
+      - NFKD
+      - lowercase
+      - collapse whitespace to single spaces
+      - strip combining marks
+      - remove punctuation/symbol/control/surrogate/format
+      - map digits -> '0'
+      - drop VS16 (FE0F), ZWJ (200D), ZWSP (200B)
+    """
+    if not s:
+        return ""
+
+    nfkd = unicodedata.normalize("NFKD", s).lower()
+    out: List[str] = []
+    last_space = False
+
+    for ch in nfkd:
+        # whitespace collapse
+        if ch.isspace():
+            if not last_space:
+                out.append(" ")
+                last_space = True
+            continue
+        last_space = False
+
+        # drop combining marks (diacritics)
+        cat = unicodedata.category(ch)
+        if cat in ("Mn", "Mc"):
+            continue
+
+        # remove punctuation/symbols/control/surrogate/format
+        if cat[0] in ("P", "S", "C"):
+            # Keep space handled above; C covers Cc/Cf/Cs
+            # We'll special-case a few below
+            pass
+
+        # special zero-width & variation selectors
+        code = ord(ch)
+        if code in (0xFE0F, 0x200D, 0x200B):
+            continue
+
+        # skip most punctuation/symbol/control
+        if cat[0] in ("P", "S"):
+            continue
+        if cat[0] == "C":
+            # control/format/surrogate
+            continue
+
+        # map digits -> '0'
+        if ch.isdigit():
+            out.append("0")
+            continue
+
+        out.append(ch)
+
+    return "".join(out).strip()
+
+
+def fnv1a64_over_utf16_units(s: str) -> int:
+    """FNV-1a 64 over UTF-16 code units like the C# implementation.
+
+    For each char, process low byte then high byte.
+    """
+    offset = 14695981039346656037
+    prime = 1099511628211
+    h = offset
+    for ch in s:
+        c = ord(ch)
+        low = c & 0xFF
+        high = (c >> 8) & 0xFF
+        h ^= low
+        h = (h * prime) & 0xFFFFFFFFFFFFFFFF
+        h ^= high
+        h = (h * prime) & 0xFFFFFFFFFFFFFFFF
+    return h
+
+
+# Trigram -> FNV hash; chat text repeats trigrams a lot. Cleared when it grows too big.
+_TRIGRAM_HASHES: Dict[str, int] = {}
+_TRIGRAM_CACHE_MAX = 1 << 16
+_MASK64 = (1 << 64) - 1
+
+
+def compute_simhash(text: str) -> Tuple[int, int]:
+    """64-bit SimHash over character trigrams of the normalized text, and its length.
+
+    Bit b is set when at least half of the trigram hashes have it set (SimHasher's
+    weight >= 0). The per-bit counts are kept bit-sliced: counters[i] holds bit i of all
+    64 counts, so adding a hash is a ripple-carry over a few ints instead of 64 updates,
+    and the final majority test is one comparison of all 64 counts at once.
+    """
+    norm = normalize_text(text)
+    n = len(norm)
+    if n < 3:
+        return (0, n)
+    cache = _TRIGRAM_HASHES
+    if len(cache) > _TRIGRAM_CACHE_MAX:
+        cache.clear()
+    counters: List[int] = []
+    for i in range(0, n - 2):
+        tri = norm[i : i + 3]
+        carry = cache.get(tri)
+        if carry is None:
+            carry = cache[tri] = fnv1a64_over_utf16_units(tri)
+        for j in range(len(counters)):
+            c = counters[j]
+            counters[j] = c ^ carry
+            carry &= c
+            if not carry:
+                break
+        else:
+            if carry:
+                counters.append(carry)
+
+    # count >= ceil(trigrams / 2), compared from the most significant count bit down
+    threshold = (n - 1) // 2
+    greater, equal = 0, _MASK64
+    for i in range(max(len(counters), threshold.bit_length()) - 1, -1, -1):
+        c = counters[i] if i < len(counters) else 0
+        if (threshold >> i) & 1:
+            equal &= c
+        else:
+            greater |= equal & c
+            equal &= ~c
+    return ((greater | equal) & _MASK64, n)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    x = (a ^ b) & _MASK64
+    try:
+        return x.bit_count()  # py3.8+
+    except AttributeError:  # pragma: no cover
+        return bin(x).count("1")
+
+
+class SimHashIndex:
+    """Multi-index hashing over 64-bit SimHashes with a sliding time window.
+
+    The hash is split into max_distance + 1 blocks, one dict per block from block value
+    to the entries having it. Two hashes within Hamming distance k differ in at most k
+    blocks, so they share at least one block exactly: a query only looks at the entries
+    in its own k + 1 buckets instead of the whole window. Entries must be added in time
+    order; those older than the window are evicted from the front as time moves on.
+    """
+
+    def __init__(self, max_distance: int, window: dt.timedelta):
+        if not 0 <= max_distance < 32:
+            raise ValueError("max_distance must be between 0 and 31")
+        self.max_distance = max_distance
+        self.window = window
+        n_blocks = max_distance + 1
+        base, extra = divmod(64, n_blocks)
+        self._blocks: List[Tuple[int, int]] = []  # (shift, mask)
+        shift = 0
+        for i in range(n_blocks):
+            width = base + (1 if i < extra else 0)
+            self._blocks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, deque]] = [{} for _ in range(n_blocks)]
+        self._entries: deque = deque()  # (ts, simhash, owner) oldest first
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def evict(self, now: dt.datetime):
+        cutoff = now - self.window
+        entries = self._entries
+        while entries and entries[0][0] < cutoff:
+            entry = entries.popleft()
+            sim = entry[1]
+            for (shift, mask), table in zip(self._blocks, self._tables):
+                key = (sim >> shift) & mask
+                bucket = table[key]
+                bucket.popleft()  # buckets are time ordered too, so this is `entry`
+                if not bucket:
+                    del table[key]
+
+    def add(self, simhash: int, ts: dt.datetime, owner: int):
+        self.evict(ts)
+        entry = (ts, simhash, owner)
+        self._entries.append(entry)
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            key = (simhash >> shift) & mask
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = deque((entry,))
+            else:
+                bucket.append(entry)
+
+    def find(self, simhash: int, now: dt.datetime, exclude_owner: Optional[int] = None) -> Optional[Tuple[dt.datetime, int, int]]:
+        """Newest entry (ts, owner, distance) within max_distance of simhash in the window, or None.
+
+        Entries of exclude_owner are ignored.
+        """
+        self.evict(now)
+        best = None
+        k = self.max_distance
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            bucket = table.get((simhash >> shift) & mask)
+            if not bucket:
+                continue
+            for ts, sim, owner in reversed(bucket):
+                if best is not None and ts <= best[0]:
+                    break
+                if owner == exclude_owner:
+                    continue
+                d = hamming_distance(simhash, sim)
+                if d <= k:
+                    best = (ts, owner, d)
+                    break
+        return best
+
+_xxh64 = None
+
+
+def xxh64_base64(data: str) -> str:
+    global _xxh64
+    if _xxh64 is None:
+        try:
+            import xxhash
+        except ImportError:
+            raise RuntimeError("xxhash is required to hash messages. Install with: pip install xxhash")
+        _xxh64 = xxhash.xxh64
+    d = _xxh64(data.encode("utf-8")).digest()
+    return base64.b64encode(d).decode("ascii")
+
+
+def compute_fingerprint(content: str) -> MessageFingerprint:
+    sim_hash, norm_len = compute_simhash(content)
+    return MessageFingerprint(len(content), xxh64_base64(content), sim_hash, norm_len)
+
+
+# ===================== XP logic (mirror ActivityHandler.cs) =====================
+
+def smoothstep_0_1(s: float) -> float:
+    if s < 0.0:
+        s = 0.0
+    elif s > 1.0:
+        s = 1.0
+    return s * s * (3.0 - 2.0 * s)
+
+
+def calculate_level(total_xp: int) -> int:
+    # return (int)Math.Pow(Math.Log10((xp + 111) / 111), 5.0243);
+    v = (total_xp + 111.0) / 111.0
+    if v <= 0:
+        return 0
+    return int(math.pow(math.log10(v), 5.0243))
+
+
+class XpBreakdown(NamedTuple):
+    """Final XP of a message and the factors it was computed from (base XP is always 1)."""
+    xp: int
+    length_xp: float
+    similarity_penalty_simple: float
+    speed_penalty_simple: float
+    similarity_penalty_complex: float
+    speed_penalty_complex: float
+    max_similarity: float  # best SimHash similarity in the author's window (0 when not compared)
+
+
+def next_guild_average(guild_avg: float, guild_count: int, msg_len: int) -> Tuple[float, int]:
+    """Guild message length EMA (N=500) and count after one more message."""
+    ema_alpha = 2.0 / (500.0 + 1.0)
+    if guild_avg <= 0.0:
+        return float(msg_len), guild_count + 1
+    return (1.0 - ema_alpha) * float(guild_avg) + ema_alpha * float(msg_len), guild_count + 1
+
+
+def compute_xp_breakdown(
+    fp: MessageFingerprint,
+    now_utc: dt.datetime,
+    prev_user_activity: Optional[Tuple[int, dt.datetime, str]],
+    recent: List[Tuple[int, int, dt.datetime]],
+    prev_guild_activity: Optional[Tuple[float, int]],
+) -> XpBreakdown:
+    """XP of a message from its fingerprint (content itself is never needed), with the length XP and every penalty factor."""
+    msg_hash, sim_hash, norm_len, msg_len = fp.hash, fp.simhash, fp.norm_len, fp.length
+
+    # Base XP (match ActivityHandler)
+    base_xp = 1
+
+    # Length-based XP (logarithmic taper relative to guild average)
+    # r = L / A, clamped to [0, 100]; bonus = B * log(1 + k*r) / log(1 + k)
+    B_len = 4.0
+    k_len = 0.025
+    if prev_guild_activity is not None and prev_guild_activity[0] > 0:
+        guild_avg = float(prev_guild_activity[0])
+        r = msg_len / guild_avg if guild_avg > 0 else 1.0
+    else:
+        r = 1.0
+    if r < 0.0:
+        r = 0.0
+    elif r > 100.0:
+        r = 100.0
+    denom_len = math.log(1.0 + k_len)
+    message_length_xp = (B_len * math.log(1.0 + (k_len * r)) / denom_len) if denom_len > 0 else (B_len * r)
+
+    # similarityPenaltySimple (same hash within 60s)
+    similarity_penalty_simple = 1.0
+    if prev_user_activity is not None:
+        _, prev_ts, prev_hash = prev_user_activity
+        if prev_hash == msg_hash and abs((now_utc - prev_ts).total_seconds()) < 60:
+            similarity_penalty_simple = 0.0
+
+    # speedPenaltySimple (logarithmic over 0..5s)
+    speed_penalty_simple = 1.0
+    if prev_user_activity is not None:
+        _, prev_ts, _ = prev_user_activity
+        dt_sec = (now_utc - prev_ts).total_seconds()
+        if dt_sec < 0:
+            dt_sec = 0.0
+        if dt_sec > 5.0:
+            dt_sec = 5.0
+        k = 9.0
+        denom = math.log(1.0 + k * 5.0)
+        speed_penalty_simple = math.log(1.0 + k * dt_sec) / denom if denom > 0 else 1.0
+
+    # similarityPenaltyComplex via SimHash against recent messages within window
+    similarity_penalty_complex = 1.0
+    max_similarity = 0.0
+    if norm_len >= 12 and sim_hash != 0 and recent:
+        for prev_sim, prev_norm_len, _ in recent:
+            if prev_sim == 0 or prev_norm_len < 12:
+                continue
+            hd = hamming_distance(sim_hash, prev_sim)
+            sim = 1.0 - (hd / 64.0)
+            if sim > max_similarity:
+                max_similarity = sim
+        if max_similarity >= 0.92:
+            similarity_penalty_complex = 0.0
+        elif max_similarity >= 0.85:
+            similarity_penalty_complex = 0.25
+
+    # speedPenaltyComplex (WPM for long messages)
+    speed_penalty_complex = 1.0
+    if prev_user_activity is not None and msg_len >= 50:
+        _, prev_ts, _ = prev_user_activity
+        minutes_since_prev = max((now_utc - prev_ts).total_seconds() / 60.0, 1e-6)
+        cpm = msg_len / minutes_since_prev
+        wpm = cpm / 5.0
+        if wpm > 200.0:
+            if wpm >= 300.0:
+                speed_penalty_complex = 0.0
+            else:
+                x = (wpm - 200.0) / 100.0
+                dec = math.log(1.0 + 9.0 * x, 10)
+                speed_penalty_complex = 1.0 - dec
+
+    xp = int(math.floor((base_xp + message_length_xp) * similarity_penalty_simple * similarity_penalty_complex * speed_penalty_simple * speed_penalty_complex))
+    return XpBreakdown(
+        xp, message_length_xp,
+        similarity_penalty_simple, speed_penalty_simple,
+        similarity_penalty_complex, speed_penalty_complex,
+        max_similarity,
+    )
+
+
+def compute_xp_from_fingerprint(
+    fp: MessageFingerprint,
+    now_utc: dt.datetime,
+    prev_user_activity: Optional[Tuple[int, dt.datetime, str]],
+    recent: List[Tuple[int, int, dt.datetime]],
+    prev_guild_activity: Optional[Tuple[float, int]],
+) -> int:
+    return compute_xp_breakdown(fp, now_utc, prev_user_activity, recent, prev_guild_activity).xp
+
+
+def advance_user_state(
+    window_minutes: int,
+    prev_user_map: Dict[int, Tuple[dt.datetime, str]],
+    recent_sim_by_user: Dict[int, deque],
+    uid: int,
+    ts: dt.datetime,
+    fp: MessageFingerprint,
+) -> Tuple[Optional[Tuple[int, dt.datetime, str]], List[Tuple[int, int, dt.datetime]]]:
+    """Record a message in its author's rolling state; returns the (prev_user, recent) it is scored against."""
+    # Build prev_user tuple as in classic path
+    prev_entry = prev_user_map.get(uid)
+    prev_user = None
+    if prev_entry is not None:
+        prev_user = (-1, prev_entry[0], prev_entry[1])  # id unused
+
+    # Recent simhashes deque for this user
+    dq = recent_sim_by_user.get(uid)
+    recent_list: List[Tuple[int, int, dt.datetime]] = []
+    if dq:
+        # drop any outside window
+        cutoff = ts - dt.timedelta(minutes=window_minutes)
+        # dq is newest-first; iterate and keep those >= cutoff
+        kept = []
+        for simv, normv, tprev in dq:
+            if tprev >= cutoff and tprev < ts:
+                kept.append((int(simv), int(normv), tprev))
+        recent_list = kept[:200]
+
+    # prev_user_map -> now
+    prev_user_map[uid] = (ts, fp.hash)
+    # recent simhashes
+    if dq is None:
+        dq = deque()
+        recent_sim_by_user[uid] = dq
+    dq.appendleft((fp.simhash, fp.norm_len, ts))
+    # trim by window time and cap 200
+    cutoff2 = ts - dt.timedelta(minutes=window_minutes)
+    while dq and dq[-1][2] < cutoff2:
+        dq.pop()
+    while len(dq) > 200:
+        dq.pop()
+    return prev_user, recent_list
+
+
+def score_user_message(
+    window_minutes: int,
+    prev_user_map: Dict[int, Tuple[dt.datetime, str]],
+    recent_sim_by_user: Dict[int, deque],
+    uid: int,
+    ts: dt.datetime,
+    fp: MessageFingerprint,
+    guild_avg: float,
+    guild_count: int,
+) -> XpBreakdown:
+    """Score one message against its author's rolling state, advance that state and return its XP breakdown.
+
+    Only the author's entries of prev_user_map/recent_sim_by_user are read or written,
+    which is what lets the parallel engine score users independently.
+    """
+    prev_user, recent_list = advance_user_state(window_minutes, prev_user_map, recent_sim_by_user, uid, ts, fp)
+    return compute_xp_breakdown(fp, ts, prev_user, recent_list, (guild_avg, guild_count))
+
+
+# ===================== Batch evaluation =====================
+
+class XpInputs(NamedTuple):
+    """Per-message inputs of the XP formula once the author's history has been looked at."""
+    length: int
+    guild_avg: float  # guild length EMA before the message (<= 0: no baseline)
+    gap: Optional[float]  # seconds since the author's previous message (None: first message)
+    same_hash: bool  # MessageHash equals the previous message's
+    max_similarity: float  # best SimHash similarity in the window (0 when not compared)
+
+
+def xp_inputs(
+    fp: MessageFingerprint,
+    now_utc: dt.datetime,
+    prev_user_activity: Optional[Tuple[int, dt.datetime, str]],
+    recent: List[Tuple[int, int, dt.datetime]],
+    prev_guild_activity: Optional[Tuple[float, int]],
+) -> XpInputs:
+    """The compute_xp_breakdown() arguments reduced to what the formulas use."""
+    guild_avg = float(prev_guild_activity[0]) if prev_guild_activity is not None else 0.0
+    gap = None
+    same_hash = False
+    if prev_user_activity is not None:
+        _, prev_ts, prev_hash = prev_user_activity
+        gap = (now_utc - prev_ts).total_seconds()
+        same_hash = prev_hash == fp.hash
+    max_similarity = 0.0
+    if fp.norm_len >= 12 and fp.simhash != 0:
+        for prev_sim, prev_norm_len, _ in recent:
+            if prev_sim == 0 or prev_norm_len < 12:
+                continue
+            sim = 1.0 - (hamming_distance(fp.simhash, prev_sim) / 64.0)
+            if sim > max_similarity:
+                max_similarity = sim
+    return XpInputs(fp.length, guild_avg, gap, same_hash, max_similarity)
+
+
+def xp_from_inputs(inp: XpInputs) -> int:
+    """Scalar XP of one XpInputs, operation for operation as compute_xp_breakdown()."""
+    msg_len, guild_avg, gap, same_hash, max_similarity = inp
+    r = msg_len / guild_avg if guild_avg > 0 else 1.0
+    if r < 0.0:
+        r = 0.0
+    elif r > 100.0:
+        r = 100.0
+    message_length_xp = 4.0 * math.log(1.0 + (0.025 * r)) / math.log(1.0 + 0.025)
+    similarity_penalty_simple = speed_penalty_simple = speed_penalty_complex = 1.0
+    if gap is not None:
+        if same_hash and abs(gap) < 60:
+            similarity_penalty_simple = 0.0
+        speed_penalty_simple = math.log(1.0 + 9.0 * min(max(gap, 0.0), 5.0)) / math.log(1.0 + 9.0 * 5.0)
+        if msg_len >= 50:
+            wpm = msg_len / max(gap / 60.0, 1e-6) / 5.0
+            if wpm >= 300.0:
+                speed_penalty_complex = 0.0
+            elif wpm > 200.0:
+                speed_penalty_complex = 1.0 - math.log(1.0 + 9.0 * ((wpm - 200.0) / 100.0), 10)
+    similarity_penalty_complex = 0.0 if max_similarity >= 0.92 else 0.25 if max_similarity >= 0.85 else 1.0
+    return int(math.floor((1 + message_length_xp) * similarity_penalty_simple * similarity_penalty_complex * speed_penalty_simple * speed_penalty_complex))
+
+
+_np = None
+
+
+def _numpy():
+    """numpy if installed (it is optional), else False."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np
+
+
+# a product this close to an integer is recomputed with the scalar code, so a last-bit
+# difference between numpy's and libm's log cannot move floor() across the boundary
+_BOUNDARY_EPS = 1e-9
+
+
+def compute_xp_batch(inputs: Sequence[XpInputs], use_numpy: Optional[bool] = None) -> List[int]:
+    """XP of many messages in one call; equal to [xp_from_inputs(i) for i in inputs].
+
+    With numpy (use_numpy None = when installed) every formula runs element-wise over
+    the whole batch; results within _BOUNDARY_EPS of an integer are recomputed scalar.
+    """
+    np = _numpy() if use_numpy is not False else False
+    if use_numpy and not np:
+        raise RuntimeError("numpy is required for the vectorized XP evaluator. Install with: pip install numpy")
+    if not np or not inputs:
+        return [xp_from_inputs(i) for i in inputs]
+
+    n = len(inputs)
+    length = np.fromiter(map(itemgetter(0), inputs), dtype=np.float64, count=n)
+    avg = np.fromiter(map(itemgetter(1), inputs), dtype=np.float64, count=n)
+    gap = np.fromiter((math.nan if i[2] is None else i[2] for i in inputs), dtype=np.float64, count=n)
+    same = np.fromiter(map(itemgetter(3), inputs), dtype=bool, count=n)
+    sim = np.fromiter(map(itemgetter(4), inputs), dtype=np.float64, count=n)
+    has_prev = ~np.isnan(gap)
+
+    with np.errstate(all="ignore"):
+        r = np.clip(np.where(avg > 0, length / np.where(avg > 0, avg, 1.0), 1.0), 0.0, 100.0)
+        length_xp = 4.0 * np.log(1.0 + (0.025 * r)) / math.log(1.0 + 0.025)
+        sim_simple = np.where(has_prev & same & (np.abs(gap) < 60), 0.0, 1.0)
+        speed_simple = np.where(has_prev, np.log(1.0 + 9.0 * np.clip(gap, 0.0, 5.0)) / math.log(1.0 + 9.0 * 5.0), 1.0)
+        wpm = length / np.maximum(gap / 60.0, 1e-6) / 5.0
+        taper = 1.0 - np.log(1.0 + 9.0 * ((wpm - 200.0) / 100.0)) / math.log(10)
+        speed_complex = np.where(
+            has_prev & (length >= 50) & (wpm > 200.0), np.where(wpm >= 300.0, 0.0, taper), 1.0
+        )
+        sim_complex = np.where(sim >= 0.92, 0.0, np.where(sim >= 0.85, 0.25, 1.0))
+        product = (1.0 + length_xp) * sim_simple * sim_complex * speed_simple * speed_complex
+    xp = np.floor(product).astype(np.int64)
+    # an exact 0 comes from a zero penalty factor, not from a log
+    near = np.nonzero((np.abs(product - np.rint(product)) <= _BOUNDARY_EPS * np.maximum(product, 1.0)) & (product != 0.0))[0]
+    out = xp.tolist()
+    for i in near.tolist():
+        out[i] = xp_from_inputs(inputs[i])
+    return out
+
+
+def score_user_messages_xp(
+    window_minutes: int,
+    prev_user_map: Dict[int, Tuple[dt.datetime, str]],
+    recent_sim_by_user: Dict[int, deque],
+    uid: int,
+    items: Iterable[Tuple[dt.datetime, MessageFingerprint, float, int]],
+) -> List[int]:
+    """XP of one author's (ts, fingerprint, guild_avg, guild_count) items in time order, evaluated as one batch."""
+    inputs = []
+    for ts, fp, guild_avg, guild_count in items:
+        prev_user, recent = advance_user_state(window_minutes, prev_user_map, recent_sim_by_user, uid, ts, fp)
+        inputs.append(xp_inputs(fp, ts, prev_user, recent, (guild_avg, guild_count)))
+    return compute_xp_batch(inputs)
+
+
+# ===================== Scorer =====================
+
+Message = Tuple[int, dt.datetime, Union[str, MessageFingerprint]]
+
+
+class Scorer:
+    """Rolling XP state of one guild.
+
+    prev_user_map: user_id -> (insert_date, message_hash) of the user's latest message
+    recent_sim_by_user: user_id -> deque[(simhash, norm_len, ts)] newest first
+    """
+
+    def __init__(self, window_minutes: int = 10, guild_avg: float = 0.0, guild_count: int = 0):
+        self.window_minutes = window_minutes
+        self.guild_avg = guild_avg
+        self.guild_count = guild_count
+        self.prev_user_map: Dict[int, Tuple[dt.datetime, str]] = {}
+        self.recent_sim_by_user: Dict[int, deque] = {}
+
+    def seed_user(
+        self,
+        user_id: int,
+        last: Optional[Tuple[dt.datetime, str]] = None,
+        recent: Iterable[Tuple[int, int, dt.datetime]] = (),
+    ):
+        """Continue from stored activity: the user's last (insert_date, hash) and window rows, newest first."""
+        if last is not None:
+            self.prev_user_map[user_id] = last
+        rows = deque(recent)
+        if rows:
+            self.recent_sim_by_user[user_id] = rows
+
+    def score(self, user_id: int, ts: dt.datetime, message: Union[str, MessageFingerprint]) -> XpBreakdown:
+        """Score one message (content or fingerprint) and advance the state."""
+        fp = message if isinstance(message, MessageFingerprint) else compute_fingerprint(message)
+        breakdown = score_user_message(
+            self.window_minutes, self.prev_user_map, self.recent_sim_by_user,
+            user_id, ts, fp, self.guild_avg, self.guild_count,
+        )
+        self.guild_avg, self.guild_count = next_guild_average(self.guild_avg, self.guild_count, fp.length)
+        return breakdown
+
+    def score_batch(self, messages: Iterable[Message]) -> List[XpBreakdown]:
+        """score() over (user_id, timestamp, content or fingerprint) tuples in time order."""
+        window = self.window_minutes
+        prev_user_map, recent_sim_by_user = self.prev_user_map, self.recent_sim_by_user
+        guild_avg, guild_count = self.guild_avg, self.guild_count
+        out: List[XpBreakdown] = []
+        append = out.append
+        try:
+            for user_id, ts, message in messages:
+                fp = message if isinstance(message, MessageFingerprint) else compute_fingerprint(message)
+                append(score_user_message(window, prev_user_map, recent_sim_by_user, user_id, ts, fp, guild_avg, guild_count))
+                guild_avg, guild_count = next_guild_average(guild_avg, guild_count, fp.length)
+        finally:
+            self.guild_avg, self.guild_count = guild_avg, guild_count
+        return out
+
+    def score_batch_xp(self, messages: Iterable[Message]) -> List[int]:
+        """Like score_batch() but only the XP, with the formulas evaluated in one compute_xp_batch() call."""
+        window = self.window_minutes
+        prev_user_map, recent_sim_by_user = self.prev_user_map, self.recent_sim_by_user
+        guild_avg, guild_count = self.guild_avg, self.guild_count
+        inputs: List[XpInputs] = []
+        try:
+            for user_id, ts, message in messages:
+                fp = message if isinstance(message, MessageFingerprint) else compute_fingerprint(message)
+                prev_user, recent = advance_user_state(window, prev_user_map, recent_sim_by_user, user_id, ts, fp)
+                inputs.append(xp_inputs(fp, ts, prev_user, recent, (guild_avg, guild_count)))
+                guild_avg, guild_count = next_guild_average(guild_avg, guild_count, fp.length)
+        finally:
+            self.guild_avg, self.guild_count = guild_avg, guild_count
+        return compute_xp_batch(inputs)
+
+
+# ===================== Self-check =====================
+
+def _random_case(rng: random.Random, now: dt.datetime) -> tuple:
+    """compute_xp_breakdown() arguments, biased towards the thresholds and clamps of the formulas."""
+    length = rng.choice((rng.randint(1, 49), rng.randint(50, 400), rng.randint(400, 5000), 50, 12))
+    sim_hash = rng.getrandbits(64)
+    fp = MessageFingerprint(length, "h%d" % rng.randint(0, 3), sim_hash, max(0, length - rng.randint(0, 5)))
+    prev_user = None
+    if rng.random() < 0.9:
+        gap = rng.choice((rng.uniform(0, 5), rng.uniform(0, 120), rng.uniform(0, 3600), 5.0, 60.0, 0.0, -rng.uniform(0, 2)))
+        prev_user = (-1, now - dt.timedelta(seconds=gap), "h%d" % rng.randint(0, 3))
+    recent = []
+    for _ in range(rng.choice((0, 1, 3))):
+        flips = rng.choice((0, 2, 4, 5, 6, 9, 10, 11, 20, 32))
+        prev_sim = sim_hash
+        for bit in rng.sample(range(64), flips):
+            prev_sim ^= 1 << bit
+        recent.append((prev_sim, rng.choice((11, 12, 40)), now))
+    avg = rng.choice((0.0, float(length), length / 100.0, length / 150.0, rng.uniform(1, 300), rng.uniform(1, 300)))
+    return fp, now, prev_user, recent, (avg, 1)
+
+
+def self_check(n: int, seed: int, use_numpy: Optional[bool]) -> int:
+    """Compare compute_xp_batch() with compute_xp_breakdown() on n random messages and time both."""
+    import time
+
+    rng = random.Random(seed)
+    now = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+    cases = [_random_case(rng, now) for _ in range(n)]
+    t0 = time.perf_counter()
+    expected = [compute_xp_breakdown(*c).xp for c in cases]
+    t_scalar = time.perf_counter() - t0
+    inputs = [xp_inputs(*c) for c in cases]
+    t0 = time.perf_counter()
+    scalar = [xp_from_inputs(i) for i in inputs]
+    t_inputs = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batch = compute_xp_batch(inputs, use_numpy)
+    t_batch = time.perf_counter() - t0
+    engine = "numpy" if use_numpy is not False and _numpy() else "pure Python"
+    bad = [i for i in range(n) if not (expected[i] == scalar[i] == batch[i])]
+    print(f"{n} messages: compute_xp_breakdown {t_scalar * 1e6 / n:.2f} us/msg, xp_from_inputs {t_inputs * 1e6 / n:.2f} us/msg, "
+          f"compute_xp_batch ({engine}) {t_batch * 1e6 / n:.2f} us/msg")
+    for i in bad[:10]:
+        print(f"  mismatch: {inputs[i]} -> breakdown {expected[i]}, scalar {scalar[i]}, batch {batch[i]}")
+    print(f"{len(bad)} mismatch(es)")
+    return 1 if bad else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Parity check and timing of the batch XP evaluator against the scalar formula")
+    ap.add_argument("--self-check", action="store_true", help="Run the parity suite (default action)")
+    ap.add_argument("--n", type=int, default=200_000, help="Random messages to compare (default: 200000)")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    ap.add_argument("--no-numpy", action="store_true", help="Check the pure-Python fallback instead of numpy")
+    args = ap.parse_args(argv)
+    return self_check(max(1, args.n), args.seed, False if args.no_numpy else None)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())